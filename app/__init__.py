@@ -1,8 +1,11 @@
-from flask import Flask, request
+from flask import Flask
 from app.extensions import db, jwt, ma, bcrypt, cors
 from app.config import Config
-from sqlalchemy import text
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from app.utils.events import broker
+from app.utils.cache import versions
+from app.utils.passwords import passwords
+from app.utils.reports import reports
+from app.utils.db_context import init_session_context
 
 
 def create_app():
@@ -14,6 +17,10 @@ def create_app():
     jwt.init_app(app)
     ma.init_app(app)
     bcrypt.init_app(app)
+    broker.init_app(app)
+    versions.init_app(app)
+    passwords.init_app(app)
+    reports.init_app(app)
 
     # Configure CORS - set this to your frontend URL
     cors.init_app(
@@ -22,33 +29,9 @@ def create_app():
         supports_credentials=True,
     )
 
-    # 2. Database User Context (SQL Server Session Context)
-    @app.before_request
-    def set_db_user_context():
-        if request.method == "OPTIONS":
-            return
-
-        # List of paths that don't need the DB context (no user yet)
-        if request.path.startswith("/api/auth/login"):
-            return
-
-        if "Authorization" in request.headers:
-            try:
-                # Check for token without crashing if it's missing or expired
-                verify_jwt_in_request(optional=True)
-                uid = get_jwt_identity()
-
-                if uid:
-                    # Sets the user_id in MSSQL session for RLS or Auditing
-                    db.session.execute(
-                        text(
-                            "EXEC sp_set_session_context @key=N'user_id', @value=:val"
-                        ),
-                        {"val": uid},
-                    )
-            except Exception as e:
-                app.logger.error(f"Context error: {e}")
-                pass
+    # 2. Database User Context (SQL Server Session Context), set lazily
+    # when a connection is checked out for an authenticated request
+    init_session_context(app)
 
     # 3. Register Blueprints (The New Granular Structure)
 
@@ -25,3 +25,48 @@ class Config:
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=12)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=7)
+
+    # Passwords. Hashes with another cost are upgraded on the next login.
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+    # Logins waiting for a worker beyond this get a 503 instead of queuing
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+    PASSWORD_HASH_TIMEOUT = 10
+
+    # Dashboard
+    # Closed (past) days are memoized per scope; the TTL only guards late back-dated edits.
+    DASHBOARD_TRENDS_CACHE_TTL = int(os.getenv("DASHBOARD_TRENDS_CACHE_TTL", 900))
+    DASHBOARD_TRENDS_MAX_DAYS = 366
+
+    # Live events (SSE). "redis" relays events between workers.
+    EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+    EVENTS_REDIS_URL = os.getenv("EVENTS_REDIS_URL", "redis://localhost:6379/0")
+    EVENTS_QUEUE_SIZE = 100
+    EVENTS_HEARTBEAT_SECONDS = 15
+
+    # Shared caches. "redis" keeps cache versions coherent across workers.
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/1")
+    # Safety net for scope entries if an invalidation is missed
+    SCOPE_CACHE_TTL = int(os.getenv("SCOPE_CACHE_TTL", 300))
+    # Vendor dropdown per distributor, 0 disables the cache
+    VENDOR_LOOKUP_CACHE_TTL = int(os.getenv("VENDOR_LOOKUP_CACHE_TTL", 60))
+
+    # Pagination. Totals of the "cached" count strategy live this long.
+    PAGINATION_COUNT_CACHE_TTL = int(os.getenv("PAGINATION_COUNT_CACHE_TTL", 30))
+    # Larger pageSize requests are streamed (a 400 where not supported)
+    PAGINATION_MAX_PAGE_SIZE = int(os.getenv("PAGINATION_MAX_PAGE_SIZE", 500))
+
+    # Reports, generated in a process pool. Files default to instance/reports.
+    REPORT_DIR = os.getenv("REPORT_DIR")
+    REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", 2))
+    # An identical request within this window gets the existing file
+    REPORT_REUSE_SECONDS = int(os.getenv("REPORT_REUSE_SECONDS", 3600))
+    REPORT_RETENTION_HOURS = int(os.getenv("REPORT_RETENTION_HOURS", 24))
+    # Running jobs heartbeat this often; one silent this long is run again
+    REPORT_HEARTBEAT_SECONDS = int(os.getenv("REPORT_HEARTBEAT_SECONDS", 30))
+    REPORT_STALL_SECONDS = int(os.getenv("REPORT_STALL_SECONDS", 300))
+    REPORT_BATCH_SIZE = int(os.getenv("REPORT_BATCH_SIZE", 5000))
+    # Session context user_id (RLS, auditing) of report queries: jobs are
+    # shared between users, so they run as this service account
+    REPORT_SERVICE_USER_ID = os.getenv("REPORT_SERVICE_USER_ID")
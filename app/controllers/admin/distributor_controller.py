@@ -1,7 +1,13 @@
+from collections import defaultdict
+from datetime import datetime
 from flask import request, jsonify
+from sqlalchemy import and_, delete, insert, literal, select
+from sqlalchemy.orm import aliased, joinedload
 from app.extensions import db
 from app.models import Distributor, DistributorView, User, Wilaya
-from app.utils.pagination import paginate
+from app.models.user import distributor_supervisors
+from app.utils.pagination import paginate, wants_stream, stream_rows
+from app.utils.principal import invalidate_scope
 
 
 def list_distributors():
@@ -11,7 +17,7 @@ def list_distributors():
     supervisor_id = request.args.get("supervisor_id")  # Filter by a specific supervisor
 
     # We use the View for basic details but we'll need the Model for relationships
-    query = Distributor.query
+    query = Distributor.query.options(joinedload(Distributor.wilaya))
 
     # 1. Filters
     if search:
@@ -29,31 +35,82 @@ def list_distributors():
     if supervisor_id and supervisor_id != "all":
         query = query.join(Distributor.supervisors).filter(User.id == supervisor_id)
 
-    paginated_data = paginate(query.order_by(Distributor.id.desc()))
+    query = query.order_by(Distributor.id.desc())
 
-    results = []
-    for d in paginated_data["items"]:
-        # Map all supervisors assigned to this distributor
-        sups = [
-            {"id": s.id, "name": f"{s.last_name} {s.first_name}"} for s in d.supervisors
-        ]
-
-        results.append(
-            {
-                "id": d.id,
-                "name": d.name,
-                "active": d.active,
-                "wilaya_id": d.wilaya_id,
-                "wilaya_name": d.wilaya.name if d.wilaya else "N/A",
-                "wilaya_code": d.wilaya.code if d.wilaya else "N/A",
-                "supervisors": sups,  # Return the whole list
-                "address": d.address,
-            }
+    if wants_stream():
+        # Distributor rows joined with their supervisors, one group per distributor
+        links = distributor_supervisors.alias()
+        sup = aliased(User)
+        lines = (
+            query.add_columns(
+                sup.id.label("sup_id"),
+                sup.last_name.label("sup_last_name"),
+                sup.first_name.label("sup_first_name"),
+            )
+            .outerjoin(links, links.c.distributor_id == Distributor.id)
+            .outerjoin(sup, sup.id == links.c.user_id)
+            .order_by(sup.last_name, sup.first_name)
+        )
+        return stream_rows(
+            lines,
+            lambda rows: _serialize_distributor(
+                rows[0].Distributor,
+                [
+                    {"id": r.sup_id, "name": f"{r.sup_last_name} {r.sup_first_name}"}
+                    for r in rows
+                    if r.sup_id is not None
+                ],
+            ),
+            group_by=lambda r: r.Distributor.id,
         )
 
+    paginated_data = paginate(query)
+    supervisors = _supervisors_by_distributor([d.id for d in paginated_data["items"]])
+
+    results = [
+        _serialize_distributor(d, supervisors.get(d.id, []))
+        for d in paginated_data["items"]
+    ]
     return jsonify({"data": results, "total": paginated_data["total"]}), 200
 
 
+def _serialize_distributor(d, supervisors):
+    return {
+        "id": d.id,
+        "name": d.name,
+        "active": d.active,
+        "wilaya_id": d.wilaya_id,
+        "wilaya_name": d.wilaya.name if d.wilaya else "N/A",
+        "wilaya_code": d.wilaya.code if d.wilaya else "N/A",
+        "supervisors": supervisors,  # Return the whole list
+        "address": d.address,
+    }
+
+
+def _supervisors_by_distributor(dist_ids):
+    """{distributor_id: [{id, name}]} for a page of distributors, in one query."""
+    if not dist_ids:
+        return {}
+
+    rows = (
+        db.session.query(
+            distributor_supervisors.c.distributor_id,
+            User.id,
+            User.last_name,
+            User.first_name,
+        )
+        .join(User, User.id == distributor_supervisors.c.user_id)
+        .filter(distributor_supervisors.c.distributor_id.in_(dist_ids))
+        .order_by(User.last_name, User.first_name)
+        .all()
+    )
+
+    grouped = defaultdict(list)
+    for dist_id, user_id, last_name, first_name in rows:
+        grouped[dist_id].append({"id": user_id, "name": f"{last_name} {first_name}"})
+    return grouped
+
+
 def create_distributor():
     data = request.json or {}
 
@@ -82,6 +139,7 @@ def create_distributor():
 
         db.session.add(new_dist)
         db.session.commit()
+        invalidate_scope(*sup_ids)
         return jsonify({"message": "Distributeur créé", "id": new_dist.id}), 201
     except Exception as e:
         db.session.rollback()
@@ -92,6 +150,9 @@ def update_distributor(dist_id):
     dist = Distributor.query.get_or_404(dist_id)
     data = request.json or {}
 
+    # Supervisors whose cached scope depends on this distributor (before the edit)
+    affected_ids = {s.id for s in dist.supervisors}
+
     dist.name = data.get("name", dist.name).strip()
     dist.wilaya_id = data.get("wilaya_id", dist.wilaya_id)
     dist.active = data.get("active", dist.active)
@@ -115,6 +176,8 @@ def update_distributor(dist_id):
 
     try:
         db.session.commit()
+        affected_ids.update(s.id for s in dist.supervisors)
+        invalidate_scope(*affected_ids)
         return jsonify({"message": "Distributeur mis à jour."}), 200
     except Exception:
         db.session.rollback()
@@ -125,20 +188,22 @@ def bulk_reassign():
     """Add a supervisor to multiple distributors without removing existing ones"""
     data = request.json or {}
     dist_ids = data.get("distributor_ids", [])
-    new_sup_id = data.get("supervisor_id")
 
-    sup = db.session.get(User, new_sup_id)
-    if not sup or sup.role != "superviseur":
+    sup = _get_supervisor(data.get("supervisor_id"))
+    if not sup:
         return jsonify({"message": "Le destinataire doit être un superviseur."}), 400
 
     try:
-        dists = Distributor.query.filter(Distributor.id.in_(dist_ids)).all()
-        for d in dists:
-            if sup not in d.supervisors:
-                d.supervisors.append(sup)
+        added = _assign(sup.id, Distributor.id.in_(dist_ids)) if dist_ids else 0
         db.session.commit()
+        invalidate_scope(sup.id)
         return (
-            jsonify({"message": f"Superviseur ajouté à {len(dists)} distributeurs."}),
+            jsonify(
+                {
+                    "message": f"Superviseur ajouté à {added} distributeurs.",
+                    "added": added,
+                }
+            ),
             200,
         )
     except Exception:
@@ -146,6 +211,123 @@ def bulk_reassign():
         return jsonify({"message": "Erreur lors de la réassignation groupée."}), 500
 
 
+def bulk_unassign():
+    """Remove a supervisor from multiple distributors"""
+    data = request.json or {}
+    dist_ids = data.get("distributor_ids", [])
+
+    sup = _get_supervisor(data.get("supervisor_id"))
+    if not sup:
+        return jsonify({"message": "Superviseur invalide."}), 400
+
+    try:
+        removed = _unassign(sup.id, dist_ids) if dist_ids else 0
+        db.session.commit()
+        invalidate_scope(sup.id)
+        return (
+            jsonify(
+                {
+                    "message": f"Superviseur retiré de {removed} distributeurs.",
+                    "removed": removed,
+                }
+            ),
+            200,
+        )
+    except Exception:
+        db.session.rollback()
+        return jsonify({"message": "Erreur lors de la désassignation groupée."}), 500
+
+
+def transfer_distributors():
+    """
+    Move distributors from one supervisor to another (all of them unless
+    `distributor_ids` is given). Distributors the target already supervises
+    are only removed from the source.
+    """
+    data = request.json or {}
+    dist_ids = data.get("distributor_ids")
+    # Only a missing key means "all": an empty selection must not move them all
+    if dist_ids is not None and not dist_ids:
+        return jsonify({"message": "Aucun distributeur sélectionné."}), 400
+
+    source = _get_supervisor(data.get("from_supervisor_id"))
+    target = _get_supervisor(data.get("to_supervisor_id"))
+    if not source or not target:
+        return (
+            jsonify(
+                {"message": "Les deux utilisateurs doivent être des superviseurs."}
+            ),
+            400,
+        )
+    if source.id == target.id:
+        return jsonify({"message": "Source et destinataire identiques."}), 400
+
+    ds = distributor_supervisors.c
+    scope = ds.user_id == source.id
+    if dist_ids is not None:
+        scope = and_(scope, ds.distributor_id.in_(dist_ids))
+
+    try:
+        added = _assign(
+            target.id, Distributor.id.in_(select(ds.distributor_id).where(scope))
+        )
+        removed = _unassign(source.id, dist_ids)
+        db.session.commit()
+        invalidate_scope(source.id, target.id)
+        return (
+            jsonify(
+                {
+                    "message": f"{removed} distributeurs transférés.",
+                    "moved": removed,
+                    "added": added,
+                }
+            ),
+            200,
+        )
+    except Exception:
+        db.session.rollback()
+        return jsonify({"message": "Erreur lors du transfert."}), 500
+
+
+def _get_supervisor(user_id):
+    if not user_id:
+        return None
+    user = db.session.get(User, user_id)
+    return user if user and user.role == "superviseur" else None
+
+
+def _assign(sup_id, dist_filter):
+    """
+    INSERT…SELECT of the junction rows matching `dist_filter` that the
+    supervisor does not have yet. Returns the number of rows added.
+    """
+    ds = distributor_supervisors.c
+    already = (
+        select(ds.distributor_id)
+        .where(ds.user_id == sup_id, ds.distributor_id == Distributor.id)
+        .exists()
+    )
+    rows = select(literal(sup_id), Distributor.id, literal(datetime.utcnow())).where(
+        dist_filter, ~already
+    )
+
+    result = db.session.execute(
+        insert(distributor_supervisors).from_select(
+            ["user_id", "distributor_id", "assigned_at"], rows
+        )
+    )
+    return result.rowcount
+
+
+def _unassign(sup_id, dist_ids=None):
+    """Deletes the supervisor's junction rows (all, or only `dist_ids`)."""
+    ds = distributor_supervisors.c
+    stmt = delete(distributor_supervisors).where(ds.user_id == sup_id)
+    if dist_ids is not None:
+        stmt = stmt.where(ds.distributor_id.in_(dist_ids))
+    return db.session.execute(stmt).rowcount
+
+
 def list_supervisors():
     supervisors = (
         User.query.filter(User.role == "superviseur")
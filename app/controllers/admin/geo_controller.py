@@ -1,6 +1,12 @@
 from flask import request, jsonify
 from app.extensions import db
+from app.models import User, Distributor
 from app.models.geography import Region, Zone, Wilaya
+from app.models.user import user_wilayas
+from app.utils.cache import versions
+from app.utils.dependency_checks import dependent_names
+from app.utils.http_cache import versioned_body, etag_response
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 
 # --- VALIDATION HELPERS ---
@@ -29,8 +35,12 @@ def validate_int(val, name):
 
 
 def list_regions():
+    return etag_response(*versioned_body("geo:regions", ["geo"], _build_regions))
+
+
+def _build_regions():
     regions = Region.query.order_by(Region.name.asc()).all()
-    return jsonify([{"id": r.id, "name": r.name} for r in regions]), 200
+    return [{"id": r.id, "name": r.name} for r in regions]
 
 
 def create_region():
@@ -46,6 +56,7 @@ def create_region():
         new_reg = Region(name=data["name"].strip())
         db.session.add(new_reg)
         db.session.commit()
+        versions.bump("geo")
         return jsonify({"id": new_reg.id, "name": new_reg.name}), 201
     except Exception:
         db.session.rollback()
@@ -56,8 +67,10 @@ def delete_region(id):
     reg = Region.query.get_or_404(id)
 
     # Dependency check: Regions -> Zones
-    if reg.zones:
-        zone_names = ", ".join([z.name for z in reg.zones])
+    zone_names = dependent_names(
+        db.session.query(Zone.name).filter(Zone.region_id == id).order_by(Zone.name)
+    )
+    if zone_names:
         return (
             jsonify(
                 {
@@ -70,6 +83,7 @@ def delete_region(id):
     try:
         db.session.delete(reg)
         db.session.commit()
+        versions.bump("geo")
         return jsonify({"message": f"Région '{reg.name}' supprimée."}), 200
     except IntegrityError:
         db.session.rollback()
@@ -87,21 +101,25 @@ def delete_region(id):
 
 
 def list_zones():
-    zones = Zone.query.order_by(Zone.name.asc()).all()
-    return (
-        jsonify(
-            [
-                {
-                    "id": z.id,
-                    "name": z.name,
-                    "region_id": z.region_id,
-                    "region_name": z.region.name if z.region else "N/A",
-                }
-                for z in zones
-            ]
-        ),
-        200,
+    return etag_response(*versioned_body("geo:zones", ["geo"], _build_zones))
+
+
+def _build_zones():
+    rows = (
+        db.session.query(Zone.id, Zone.name, Zone.region_id, Region.name)
+        .outerjoin(Region, Region.id == Zone.region_id)
+        .order_by(Zone.name.asc())
+        .all()
     )
+    return [
+        {
+            "id": z_id,
+            "name": name,
+            "region_id": region_id,
+            "region_name": region_name or "N/A",
+        }
+        for z_id, name, region_id, region_name in rows
+    ]
 
 
 def create_zone():
@@ -121,6 +139,7 @@ def create_zone():
         new_zone = Zone(name=data["name"].strip(), region_id=reg_id)
         db.session.add(new_zone)
         db.session.commit()
+        versions.bump("geo")
         return jsonify({"id": new_zone.id, "name": new_zone.name}), 201
     except Exception:
         db.session.rollback()
@@ -131,8 +150,10 @@ def delete_zone(id):
     zone = Zone.query.get_or_404(id)
 
     # Dependency check: Zones -> Wilayas
-    if zone.wilayas:
-        wilaya_names = ", ".join([w.name for w in zone.wilayas])
+    wilaya_names = dependent_names(
+        db.session.query(Wilaya.name).filter(Wilaya.zone_id == id).order_by(Wilaya.name)
+    )
+    if wilaya_names:
         return (
             jsonify(
                 {
@@ -145,6 +166,7 @@ def delete_zone(id):
     try:
         db.session.delete(zone)
         db.session.commit()
+        versions.bump("geo")
         return jsonify({"message": f"Zone '{zone.name}' supprimée."}), 200
     except IntegrityError:
         db.session.rollback()
@@ -162,25 +184,31 @@ def delete_zone(id):
 
 
 def list_wilayas():
-    wilayas = Wilaya.query.order_by(Wilaya.zone_id, Wilaya.code).all()
-    return (
-        jsonify(
-            [
-                {
-                    "id": w.id,
-                    "name": w.name,
-                    "code": w.code,
-                    "zone_id": w.zone_id,
-                    "zone_name": w.zone.name if w.zone else "N/A",
-                    "region_name": (
-                        w.zone.region.name if (w.zone and w.zone.region) else "N/A"
-                    ),
-                }
-                for w in wilayas
-            ]
-        ),
-        200,
+    return etag_response(*versioned_body("geo:wilayas", ["geo"], _build_wilayas))
+
+
+def _build_wilayas():
+    # Zone and region names come from the same query (no per-row lazy loads)
+    rows = (
+        db.session.query(
+            Wilaya.id, Wilaya.name, Wilaya.code, Wilaya.zone_id, Zone.name, Region.name
+        )
+        .outerjoin(Zone, Zone.id == Wilaya.zone_id)
+        .outerjoin(Region, Region.id == Zone.region_id)
+        .order_by(Wilaya.zone_id, Wilaya.code)
+        .all()
     )
+    return [
+        {
+            "id": w_id,
+            "name": name,
+            "code": code,
+            "zone_id": zone_id,
+            "zone_name": zone_name or "N/A",
+            "region_name": region_name or "N/A",
+        }
+        for w_id, name, code, zone_id, zone_name, region_name in rows
+    ]
 
 
 def create_wilaya():
@@ -204,6 +232,7 @@ def create_wilaya():
         new_wilaya = Wilaya(name=data["name"].strip(), code=code_val, zone_id=zone_id)
         db.session.add(new_wilaya)
         db.session.commit()
+        versions.bump("geo")
         return jsonify({"id": new_wilaya.id, "name": new_wilaya.name}), 201
     except Exception:
         db.session.rollback()
@@ -214,8 +243,12 @@ def delete_wilaya(id):
     wilaya = Wilaya.query.get_or_404(id)
 
     # 1. Dependency Check: Wilaya -> Distributors
-    if wilaya.distributors:
-        dist_names = ", ".join([d.name for d in wilaya.distributors])
+    dist_names = dependent_names(
+        db.session.query(Distributor.name)
+        .filter(Distributor.wilaya_id == id)
+        .order_by(Distributor.name)
+    )
+    if dist_names:
         return (
             jsonify(
                 {
@@ -226,11 +259,14 @@ def delete_wilaya(id):
         )
 
     # 2. Dependency Check: Wilaya -> Supervisors
-    assigned_supervisors = wilaya.supervisors.all()
-    if assigned_supervisors:
-        sup_names = ", ".join(
-            [f"{s.first_name} {s.last_name}" for s in assigned_supervisors]
-        )
+    sup_name = func.concat(User.first_name, " ", User.last_name)
+    sup_names = dependent_names(
+        db.session.query(sup_name)
+        .join(user_wilayas, user_wilayas.c.user_id == User.id)
+        .filter(user_wilayas.c.wilaya_id == id)
+        .order_by(sup_name)
+    )
+    if sup_names:
         return (
             jsonify(
                 {
@@ -243,6 +279,7 @@ def delete_wilaya(id):
     try:
         db.session.delete(wilaya)
         db.session.commit()
+        versions.bump("geo")
         return jsonify({"message": f"Wilaya '{wilaya.name}' supprimée."}), 200
     except IntegrityError:
         db.session.rollback()
@@ -1,8 +1,10 @@
 from flask import request, jsonify
 from app.extensions import db
 from app.models import Product
-from app.utils.pagination import paginate
+from app.utils.pagination import paginate, wants_stream, stream_rows
+from app.utils.cache import versions
 from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
 
 
 def list_products():
@@ -11,7 +13,7 @@ def list_products():
     order_by = request.args.get("order_by")
     type_id = request.args.get("type_id")
 
-    query = Product.query
+    query = Product.query.options(joinedload(Product.category))
 
     if search:
         query = query.filter(
@@ -25,30 +27,19 @@ def list_products():
         query = query.filter(Product.type_id == type_id)
 
     if order_by == "name":
-        paginated_data = paginate(query.order_by(Product.name.asc()))
+        query = query.order_by(Product.name.asc())
     else:
-        paginated_data = paginate(query.order_by(Product.id.desc()))
+        query = query.order_by(Product.id.desc())
+
+    if wants_stream():
+        return stream_rows(query, _serialize_product)
+
+    paginated_data = paginate(query)
 
     return (
         jsonify(
             {
-                "data": [
-                    {
-                        "id": p.id,
-                        "code": p.code,
-                        "name": p.name,
-                        "format": p.format,
-                        "category": p.category.name if p.category else None,
-                        "price_factory": float(p.price_factory),
-                        "active": p.active,
-                        "price_wholesale": p.price_wholesale,
-                        "price_retail": p.price_retail,
-                        "price_supermarket": p.price_supermarket,
-                        "category_id": p.category_id,
-                        "type_id": p.type_id,
-                    }
-                    for p in paginated_data["items"]
-                ],
+                "data": [_serialize_product(p) for p in paginated_data["items"]],
                 "total": paginated_data["total"],
             }
         ),
@@ -56,6 +47,23 @@ def list_products():
     )
 
 
+def _serialize_product(p):
+    return {
+        "id": p.id,
+        "code": p.code,
+        "name": p.name,
+        "format": p.format,
+        "category": p.category.name if p.category else None,
+        "price_factory": float(p.price_factory),
+        "active": p.active,
+        "price_wholesale": p.price_wholesale,
+        "price_retail": p.price_retail,
+        "price_supermarket": p.price_supermarket,
+        "category_id": p.category_id,
+        "type_id": p.type_id,
+    }
+
+
 def create_product():
     data = request.json
     new_prod = Product(
@@ -72,6 +80,7 @@ def create_product():
     )
     db.session.add(new_prod)
     db.session.commit()
+    versions.bump("products")
     return jsonify({"message": "Produit créé", "id": new_prod.id}), 201
 
 
@@ -90,4 +99,5 @@ def update_product(product_id):
     prod.active = data.get("active", prod.active)
 
     db.session.commit()
+    versions.bump("products")
     return jsonify({"message": "Produit mis à jour"}), 200
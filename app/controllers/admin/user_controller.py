@@ -1,15 +1,19 @@
 from flask import request, jsonify
 from app.extensions import db, bcrypt
 from app.models import User, Wilaya, Zone, Region, Distributor
+from app.models.user import distributor_supervisors
 from app.utils.pagination import paginate
-from sqlalchemy import or_
+from app.utils.principal import invalidate_scope
+from app.utils.cache import versions
+from app.utils.dependency_checks import dependent_names
+from sqlalchemy import exists, or_
 
 
 def list_users():
     search = request.args.get("search", "")
     role_filter = request.args.get("role", "all")
 
-    query = User.query
+    query = User.query.options(*User.to_dict_options())
 
     if search:
         query = query.filter(
@@ -62,6 +66,7 @@ def create_user():
 
     try:
         db.session.commit()
+        versions.bump("users")
         return jsonify({"message": "Utilisateur créé", "id": new_user.id}), 201
     except Exception as e:
         db.session.rollback()
@@ -89,6 +94,8 @@ def update_user(user_id):
 
     try:
         db.session.commit()
+        invalidate_scope(user.id)
+        versions.bump("users")
         return jsonify({"message": "Utilisateur mis à jour."}), 200
     except Exception:
         db.session.rollback()
@@ -98,17 +105,26 @@ def update_user(user_id):
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
 
-    # 🔹 FIX: Use .count() instead of len() for dynamic relationships
-    orphaned_dists = []
-    for d in user.supervised_distributors:
-        if d.supervisors.count() == 1:  # Only this user manages it
-            orphaned_dists.append(d.name)
+    # 🔹 Distributors this user is the only supervisor of
+    own = distributor_supervisors.alias("own")
+    other = distributor_supervisors.alias("other")
+    orphaned_dists = dependent_names(
+        db.session.query(Distributor.name)
+        .join(own, own.c.distributor_id == Distributor.id)
+        .filter(
+            own.c.user_id == user.id,
+            ~exists().where(
+                other.c.distributor_id == Distributor.id, other.c.user_id != user.id
+            ),
+        )
+        .order_by(Distributor.name)
+    )
 
     if orphaned_dists:
         return (
             jsonify(
                 {
-                    "message": f"Action bloquée : ce superviseur est le seul assigné aux distributeurs : {', '.join(orphaned_dists)}. Réaffectez-les d'abord."
+                    "message": f"Action bloquée : ce superviseur est le seul assigné aux distributeurs : {orphaned_dists}. Réaffectez-les d'abord."
                 }
             ),
             400,
@@ -117,6 +133,8 @@ def delete_user(user_id):
     try:
         db.session.delete(user)
         db.session.commit()
+        invalidate_scope(user_id)
+        versions.bump("users")
         return jsonify({"message": "Utilisateur supprimé."}), 200
     except Exception as e:
         db.session.rollback()
@@ -1,8 +1,9 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from flask_jwt_extended import create_access_token, get_jwt_identity
 from sqlalchemy import text
-from app.extensions import bcrypt, db
+from app.extensions import db
 from app.models import User
+from app.utils.passwords import passwords, PasswordHasherBusy
 
 def login():
     data = request.get_json() or {}
@@ -17,30 +18,46 @@ def login():
     if "@" in identifier:
         identifier = identifier.split("@")[0]
 
-    user = User.query.filter_by(username=identifier).first()
+    # Lookup on the unique username, with everything to_dict() reads
+    user = (
+        User.query.options(*User.to_dict_options())
+        .filter(User.username == identifier)
+        .first()
+    )
 
-    if user and bcrypt.check_password_hash(user.password_hash, password):
+    try:
+        valid = user is not None and passwords.check(user.password_hash, password)
+    except PasswordHasherBusy:
+        return (
+            jsonify({"message": "Service occupé, veuillez réessayer"}),
+            503,
+            {"Retry-After": "1"},
+        )
+
+    if valid:
         access_token = create_access_token(
             identity=str(user.id),
             additional_claims={"role": user.role},
         )
+        payload = {"token": access_token, "user": user.to_dict()}
 
-        return (
-            jsonify(
-                {
-                    "token": access_token,
-                    "user": user.to_dict(),
-                }
-            ),
-            200,
-        )
+        # 🔹 Upgrade hashes made with an older cost factor
+        if passwords.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = passwords.hash(password)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Rehash error: {e}")
+
+        return jsonify(payload), 200
 
     return jsonify({"message": "Identifiants invalides"}), 401
 
 
 def me():
     uid = get_jwt_identity()
-    user = User.query.get(int(uid))
+    user = User.query.options(*User.to_dict_options()).get(int(uid))
     if not user:
         return jsonify({"error": "User not found"}), 404
     return jsonify(user.to_dict())
@@ -1,5 +1,5 @@
-from flask import jsonify, request
-from flask_jwt_extended import get_jwt_identity
+import json
+from flask import jsonify, request, current_app
 from app.models import (
     ProductCategory,
     ProductType,
@@ -13,29 +13,101 @@ from app.models import (
     Vendor,
 )
 from app.extensions import db
+from app.utils.principal import get_principal
+from app.utils.scoping import scope_to_supervisor
+from app.utils.cache import TTLCache, versioned
+from app.utils.http_cache import versioned_body, etag_response, content_hash
+from sqlalchemy.orm import joinedload
+
+# Catalog versions recently served, by ETag, to answer `?since=` deltas
+_catalog_snapshots = TTLCache(maxsize=16)
 
 
 def get_admin_metadata():
-    """Dropdowns for Admin panel"""
-    supervisors = User.query.filter_by(role="superviseur", active=True).all()
-    wilayas = Wilaya.query.all()
-    categories = ProductCategory.query.all()
-    types = ProductType.query.all()
+    """
+    Dropdowns for Admin panel. `?sections=wilayas,categories` returns only
+    those sections; `versions` holds a content hash per section so clients
+    can refresh just the ones that changed.
+    """
+    requested = request.args.get("sections")
+    if requested:
+        sections = sorted({s.strip() for s in requested.split(",") if s.strip()})
+        unknown = [s for s in sections if s not in ADMIN_METADATA_SECTIONS]
+        if unknown:
+            return (
+                jsonify({"message": f"Sections inconnues : {', '.join(unknown)}"}),
+                400,
+            )
+    else:
+        sections = sorted(ADMIN_METADATA_SECTIONS)
 
-    return (
-        jsonify(
-            {
-                "supervisors": [
-                    {"id": s.id, "name": f"{s.first_name} {s.last_name}"}
-                    for s in supervisors
-                ],
-                "wilayas": [{"id": w.id, "name": w.name} for w in wilayas],
-                "categories": [{"id": c.id, "name": c.name} for c in categories],
-                "product_types": [{"id": t.id, "name": t.name} for t in types],
-            }
-        ),
-        200,
+    names = sorted({v for s in sections for v in ADMIN_METADATA_SECTIONS[s][0]})
+    return etag_response(
+        *versioned_body(
+            "admin-metadata:" + ",".join(sections),
+            names,
+            lambda: _build_admin_metadata(sections),
+        )
+    )
+
+
+def _build_admin_metadata(sections):
+    bundle = {"versions": {}}
+    for section in sections:
+        names, build = ADMIN_METADATA_SECTIONS[section]
+        data, digest = versioned(f"admin-metadata:{section}", names, build)
+        bundle[section] = data
+        bundle["versions"][section] = digest
+    return bundle
+
+
+def _section(build):
+    """Section builder returning (data, content hash)."""
+
+    def wrapper():
+        data = build()
+        return data, content_hash(json.dumps(data, sort_keys=True))
+
+    return wrapper
+
+
+def _metadata_supervisors():
+    rows = (
+        db.session.query(User.id, User.first_name, User.last_name)
+        .filter(User.role == "superviseur", User.active == True)
+        .all()
     )
+    return [{"id": u_id, "name": f"{first} {last}"} for u_id, first, last in rows]
+
+
+def _metadata_wilayas():
+    return [
+        {"id": w_id, "name": name}
+        for w_id, name in db.session.query(Wilaya.id, Wilaya.name)
+    ]
+
+
+def _metadata_categories():
+    return [
+        {"id": c_id, "name": name}
+        for c_id, name in db.session.query(ProductCategory.id, ProductCategory.name)
+    ]
+
+
+def _metadata_product_types():
+    return [
+        {"id": t_id, "name": name}
+        for t_id, name in db.session.query(ProductType.id, ProductType.name)
+    ]
+
+
+# section -> (version names, builder)
+ADMIN_METADATA_SECTIONS = {
+    "supervisors": (["users"], _section(_metadata_supervisors)),
+    "wilayas": (["geo"], _section(_metadata_wilayas)),
+    "categories": (["products"], _section(_metadata_categories)),
+    "product_types": (["products"], _section(_metadata_product_types)),
+}
 
 
 def get_distributors_scoped():
@@ -43,18 +115,19 @@ def get_distributors_scoped():
     FIXED: Uses the Many-to-Many relationship instead of a missing column.
     Returns distributors assigned to the user.
     """
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal(required=False)
 
-    if not user:
+    if not principal:
         return jsonify({"message": "Utilisateur non trouvé"}), 404
 
-    # 🔹 If Supervisor: Get from junction table
-    if user.role == "superviseur":
-        dists = [d for d in user.supervised_distributors if d.active]
-    else:
-        # 🔹 Admin/DG/DC see all active distributors
-        dists = Distributor.query.filter_by(active=True).all()
+    query = Distributor.query.options(joinedload(Distributor.wilaya)).filter_by(
+        active=True
+    )
+
+    # 🔹 If Supervisor: Only the distributors assigned in the junction table
+    query = scope_to_supervisor(query, Distributor.id, principal)
+    # 🔹 Admin/DG/DC see all active distributors
+    dists = query.all()
 
     return (
         jsonify(
@@ -72,51 +145,127 @@ def get_distributors_scoped():
 
 
 def get_products_lookup():
-    """Returns products with all price types"""
-    prods = Product.query.filter_by(active=True).all()
+    """
+    Returns products with all price types. With `?since=<ETag>` only the
+    products changed or removed since that catalog version are returned.
+    """
+    body, etag = versioned_body("products:lookup", ["products"], _build_products_lookup)
+    current = _catalog_snapshot(body, etag)
+
+    since = request.args.get("since")
+    if since is None:
+        return etag_response(body, etag)
+
+    previous = _catalog_snapshots.get(since.strip('"'))
+    if previous is None:
+        # Unknown or expired version: the client has to take the full catalog
+        changed, removed, full = list(current.values()), [], True
+    else:
+        changed = [p for pid, p in current.items() if previous.get(pid) != p]
+        removed = [pid for pid in previous if pid not in current]
+        full = False
+
     return (
         jsonify(
-            [
-                {
-                    "id": p.id,
-                    "code": p.code,
-                    "name": p.name,
-                    "price_factory": float(p.price_factory or 0),
-                    "price_wholesale": float(p.price_wholesale or 0),
-                    "price_retail": float(p.price_retail or 0),
-                    "price_supermarket": float(p.price_supermarket or 0),
-                    "category": p.category.name if p.category else "N/A",
-                }
-                for p in prods
-            ]
+            {"version": etag, "full": full, "changed": changed, "removed": removed}
         ),
         200,
     )
 
 
+def _build_products_lookup():
+    rows = (
+        db.session.query(
+            Product.id,
+            Product.code,
+            Product.name,
+            Product.price_factory,
+            Product.price_wholesale,
+            Product.price_retail,
+            Product.price_supermarket,
+            ProductCategory.name,
+        )
+        .outerjoin(ProductCategory, ProductCategory.id == Product.category_id)
+        .filter(Product.active == True)
+        .order_by(Product.id)
+        .all()
+    )
+    return [
+        {
+            "id": r[0],
+            "code": r[1],
+            "name": r[2],
+            "price_factory": float(r[3] or 0),
+            "price_wholesale": float(r[4] or 0),
+            "price_retail": float(r[5] or 0),
+            "price_supermarket": float(r[6] or 0),
+            "category": r[7] or "N/A",
+        }
+        for r in rows
+    ]
+
+
+def _catalog_snapshot(body, etag):
+    """{product_id: product} of a catalog version, kept for `since` deltas."""
+    snapshot = _catalog_snapshots.get(etag)
+    if snapshot is None:
+        snapshot = {p["id"]: p for p in json.loads(body)}
+        _catalog_snapshots.set(etag, snapshot)
+    return snapshot
+
+
 def get_vendors_by_distributor(dist_id):
-    """Fetches vendors for a specific distributor"""
-    distributor = Distributor.query.get_or_404(dist_id)
-    vendors = sorted(distributor.vendors, key=lambda v: not v.active)
-    return (
-        jsonify(
-            [
-                {
-                    "id": v.id,
-                    "name": f"{v.first_name} {v.last_name}",
-                    "code": v.code,
-                    "type": v.vendor_type,
-                    "active": v.active,
-                }
-                for v in vendors
-            ]
-        ),
-        200,
+    """Fetches vendors for a specific distributor (active ones first)"""
+    ttl = current_app.config.get("VENDOR_LOOKUP_CACHE_TTL")
+    if ttl:
+        key = f"vendors:{dist_id}"
+        vendors = versioned(key, [key], lambda: _query_vendors(dist_id), ttl=ttl)
+    else:
+        vendors = _query_vendors(dist_id)
+
+    # Only an empty list needs telling "no vendors" from "no distributor"
+    if not vendors:
+        Distributor.query.get_or_404(dist_id)
+
+    return jsonify(vendors), 200
+
+
+def _query_vendors(dist_id):
+    rows = (
+        db.session.query(
+            Vendor.id,
+            Vendor.first_name,
+            Vendor.last_name,
+            Vendor.code,
+            Vendor.vendor_type,
+            Vendor.active,
+        )
+        .filter(Vendor.distributor_id == dist_id)
+        .order_by(Vendor.active.desc(), Vendor.id)
+        .all()
     )
+    return [
+        {
+            "id": v_id,
+            "name": f"{first_name} {last_name}",
+            "code": code,
+            "type": vendor_type,
+            "active": active,
+        }
+        for v_id, first_name, last_name, code, vendor_type, active in rows
+    ]
 
 
 def get_categories_with_formats():
     """Hierarchical list of categories and their available formats"""
+    return etag_response(
+        *versioned_body(
+            "products:categories", ["products"], _build_categories_with_formats
+        )
+    )
+
+
+def _build_categories_with_formats():
     query_data = (
         db.session.query(ProductCategory.id, ProductCategory.name, Product.format)
         .join(Product, Product.category_id == ProductCategory.id)
@@ -124,31 +273,40 @@ def get_categories_with_formats():
         .distinct()
         .all()
     )
-    structured = {}
+    names, formats = {}, {}
     for cat_id, cat_name, p_format in query_data:
-        if cat_id not in structured:
-            structured[cat_id] = {"id": cat_id, "name": cat_name, "formats": []}
-        if p_format and p_format not in structured[cat_id]["formats"]:
-            structured[cat_id]["formats"].append(p_format)
+        names[cat_id] = cat_name
+        cat_formats = formats.setdefault(cat_id, set())
+        if p_format:
+            cat_formats.add(p_format)
 
-    return jsonify(sorted(list(structured.values()), key=lambda x: x["name"])), 200
+    structured = [
+        {"id": cat_id, "name": name, "formats": sorted(formats[cat_id])}
+        for cat_id, name in names.items()
+    ]
+    return sorted(structured, key=lambda x: x["name"])
 
 
 def get_geography_tree():
-    regions = Region.query.all()
-    return (
-        jsonify(
-            {
-                "regions": [{"id": r.id, "name": r.name} for r in regions],
-                "zones": [
-                    {"id": z.id, "name": z.name, "region_id": z.region_id}
-                    for z in Zone.query.all()
-                ],
-                "wilayas": [
-                    {"id": w.id, "name": w.name, "zone_id": w.zone_id}
-                    for w in Wilaya.query.all()
-                ],
-            }
-        ),
-        200,
-    )
+    return etag_response(*versioned_body("geo:tree", ["geo"], _build_geography_tree))
+
+
+def _build_geography_tree():
+    return {
+        "regions": [
+            {"id": r_id, "name": name}
+            for r_id, name in db.session.query(Region.id, Region.name)
+        ],
+        "zones": [
+            {"id": z_id, "name": name, "region_id": region_id}
+            for z_id, name, region_id in db.session.query(
+                Zone.id, Zone.name, Zone.region_id
+            )
+        ],
+        "wilayas": [
+            {"id": w_id, "name": name, "zone_id": zone_id}
+            for w_id, name, zone_id in db.session.query(
+                Wilaya.id, Wilaya.name, Wilaya.zone_id
+            )
+        ],
+    }
@@ -1,17 +1,25 @@
-from flask import jsonify
-from flask_jwt_extended import get_jwt_identity
+from flask import jsonify, request, current_app, Response
 from app.extensions import db
 from app.models import Sale, Purchase, Visit, User, Inventory, Product, SaleItem
+from app.utils.cache import TTLCache
+from app.utils.principal import get_principal
+from app.utils.scoping import supervised_by
+from app.utils.events import broker
 from sqlalchemy import func, text
-from datetime import datetime
+from datetime import datetime, date, timedelta
+import calendar
+import json
+import queue
+
+# Daily totals of closed days, keyed by (table, scope, start, end)
+_trend_cache = TTLCache(maxsize=512)
 
 
 def get_stats():
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
 
-    # 🔹 SCOPING: Extract IDs from the junction table
-    dist_ids = [d.id for d in user.supervised_distributors if d.active]
+    # 🔹 SCOPING: Active distributors from the request principal
+    dist_ids = sorted(principal.active_distributor_ids)
 
     if not dist_ids:
         return (
@@ -32,19 +40,22 @@ def get_stats():
             200,
         )
 
+    def in_scope(model):
+        return supervised_by(model.distributor_id, principal.id, active_only=True)
+
     today = datetime.now()
     first_day = today.replace(day=1, hour=0, minute=0, second=0)
 
     # Sales & Purchases
     sales_total = (
         db.session.query(func.sum(Sale.total_amount))
-        .filter(Sale.distributor_id.in_(dist_ids), Sale.date >= first_day)
+        .filter(in_scope(Sale), Sale.date >= first_day)
         .scalar()
         or 0
     )
     purchases_total = (
         db.session.query(func.sum(Purchase.total_amount))
-        .filter(Purchase.distributor_id.in_(dist_ids), Purchase.date >= first_day)
+        .filter(in_scope(Purchase), Purchase.date >= first_day)
         .scalar()
         or 0
     )
@@ -52,7 +63,7 @@ def get_stats():
     # Visits Coverage
     v_stats = (
         db.session.query(func.sum(Visit.planned_visits), func.sum(Visit.actual_visits))
-        .filter(Visit.distributor_id.in_(dist_ids), Visit.date >= first_day)
+        .filter(in_scope(Visit), Visit.date >= first_day)
         .first()
     )
     planned, actual = v_stats[0] or 0, v_stats[1] or 0
@@ -60,7 +71,7 @@ def get_stats():
 
     # Low Stock
     low_stock = Inventory.query.filter(
-        Inventory.distributor_id.in_(dist_ids), Inventory.quantity <= 5
+        in_scope(Inventory), Inventory.quantity <= 5
     ).count()
 
     # Top 5 Vendors
@@ -70,7 +81,7 @@ def get_stats():
             func.sum(Sale.total_amount).label("total"),
         )
         .join(Sale, Sale.vendor_id == User.id)
-        .filter(Sale.date >= first_day, Sale.distributor_id.in_(dist_ids))
+        .filter(Sale.date >= first_day, in_scope(Sale))
         .group_by(User.id, User.first_name, User.last_name)
         .order_by(text("total DESC"))
         .limit(5)
@@ -82,7 +93,7 @@ def get_stats():
         db.session.query(Product.name, func.sum(SaleItem.quantity).label("qty"))
         .join(SaleItem, SaleItem.product_id == Product.id)
         .join(Sale, Sale.id == SaleItem.sale_id)
-        .filter(Sale.date >= first_day, Sale.distributor_id.in_(dist_ids))
+        .filter(Sale.date >= first_day, in_scope(Sale))
         .group_by(Product.id, Product.name)
         .order_by(text("qty DESC"))
         .limit(5)
@@ -112,3 +123,190 @@ def get_stats():
         ),
         200,
     )
+
+
+def get_trends():
+    principal = get_principal()
+
+    # 🔹 SCOPING: Same distributor set as get_stats
+    dist_ids = sorted(principal.active_distributor_ids)
+
+    dist_id = request.args.get("distributor_id", type=int)
+    if dist_id:
+        if dist_id not in dist_ids:
+            return jsonify({"message": "Accès non autorisé à ce distributeur"}), 403
+        dist_ids = [dist_id]
+
+    today = date.today()
+    try:
+        start = _parse_date(request.args.get("startDate")) or today.replace(day=1)
+        end = _parse_date(request.args.get("endDate")) or today
+    except ValueError:
+        return jsonify({"message": "Format de date invalide"}), 400
+
+    max_days = current_app.config.get("DASHBOARD_TRENDS_MAX_DAYS", 366)
+    if start > end or (end - start).days + 1 > max_days:
+        return jsonify({"message": "Période invalide"}), 400
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    scope = (principal.id, tuple(dist_ids))
+    if not dist_ids:
+        sales_series, purchases_series = {}, {}
+    else:
+        sales_series = _daily_totals(Sale, scope, start, end)
+        purchases_series = _daily_totals(Purchase, scope, start, end)
+
+    totals = {
+        "sales": sum(sales_series.values(), 0.0),
+        "purchases": sum(purchases_series.values(), 0.0),
+    }
+
+    comparisons = {}
+    for label, months in (("mom", 1), ("yoy", 12)):
+        prev_start, prev_end = _shift_months(start, -months), _shift_months(
+            end, -months
+        )
+        comparisons[label] = {
+            "start": prev_start.isoformat(),
+            "end": prev_end.isoformat(),
+            "sales": _delta(
+                totals["sales"],
+                _period_total(Sale, scope, prev_start, prev_end),
+            ),
+            "purchases": _delta(
+                totals["purchases"],
+                _period_total(Purchase, scope, prev_start, prev_end),
+            ),
+        }
+
+    return (
+        jsonify(
+            {
+                "data": {
+                    "range": {"start": start.isoformat(), "end": end.isoformat()},
+                    "series": [
+                        {
+                            "date": d.isoformat(),
+                            "sales": sales_series.get(d, 0.0),
+                            "purchases": purchases_series.get(d, 0.0),
+                        }
+                        for d in days
+                    ],
+                    "totals": totals,
+                    "comparisons": comparisons,
+                }
+            }
+        ),
+        200,
+    )
+
+
+def stream_events():
+    """Server-sent events: compact "distributor X changed" notifications."""
+    principal = get_principal()
+
+    # 🔹 SCOPING: Supervisors only hear about their own distributors
+    allowed = None
+    if principal.role == "superviseur":
+        allowed = principal.distributor_ids
+
+    heartbeat = current_app.config.get("EVENTS_HEARTBEAT_SECONDS", 15)
+
+    def generate():
+        with broker.subscribe() as q:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = q.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                dist_id = event.get("distributor_id")
+                if (
+                    allowed is not None
+                    and dist_id is not None
+                    and dist_id not in allowed
+                ):
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _daily_totals(model, scope, start, end):
+    """
+    {date: amount} for the range. Days before today are memoized per
+    distributor set, only today (and any future-dated rows) hit the database
+    on every call. `scope` is (user_id, distributor IDs).
+    """
+    today = date.today()
+    totals = {}
+
+    closed_end = min(end, today - timedelta(days=1))
+    if start <= closed_end:
+        key = (model.__tablename__, scope[1], start, closed_end)
+        totals.update(
+            _trend_cache.get_or_set(
+                key,
+                lambda: _query_daily_totals(model, scope, start, closed_end),
+                ttl=current_app.config.get("DASHBOARD_TRENDS_CACHE_TTL"),
+            )
+        )
+
+    if end >= today:
+        totals.update(_query_daily_totals(model, scope, max(start, today), end))
+
+    return totals
+
+
+def _query_daily_totals(model, scope, start, end):
+    user_id, dist_ids = scope
+    if len(dist_ids) == 1:
+        in_scope = model.distributor_id == dist_ids[0]
+    else:
+        in_scope = supervised_by(model.distributor_id, user_id, active_only=True)
+
+    rows = (
+        db.session.query(model.date, func.sum(model.total_amount))
+        .filter(
+            in_scope,
+            model.date >= start,
+            model.date <= end,
+        )
+        .group_by(model.date)
+        .all()
+    )
+    return {d: float(total or 0) for d, total in rows}
+
+
+def _period_total(model, scope, start, end):
+    if not scope[1]:
+        return 0.0
+    return sum(_daily_totals(model, scope, start, end).values(), 0.0)
+
+
+def _delta(current, previous):
+    return {
+        "current": current,
+        "previous": previous,
+        "delta": current - previous,
+        "pct": round((current - previous) / previous * 100, 1) if previous else None,
+    }
+
+
+def _shift_months(d, months):
+    month_index = d.month - 1 + months
+    year, month = d.year + month_index // 12, month_index % 12 + 1
+    return d.replace(
+        year=year, month=month, day=min(d.day, calendar.monthrange(year, month)[1])
+    )
+
+
+def _parse_date(value):
+    return datetime.fromisoformat(value).date() if value else None
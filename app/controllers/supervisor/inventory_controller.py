@@ -6,33 +6,85 @@ from app.models import (
     InventoryHistoryView,
     StockAdjustment,
     Product,
-    User,
     Distributor,
     PhysicalInventory,
 )
 from app.utils.stock_ops import update_stock_incremental
-from app.utils.pagination import paginate
+from app.utils.pagination import paginate, wants_stream, stream_rows
+from app.utils.principal import get_principal
+from app.utils.events import broker
+from app.utils.exports import export_response
 from datetime import datetime
 from sqlalchemy import and_, text, or_
+from sqlalchemy.orm import contains_eager
+
+# Columns of the export: (header, row -> value)
+STOCK_EXPORT_COLUMNS = [
+    ("Code produit", lambda r: r.Inventory.product.code),
+    ("Produit", lambda r: r.Inventory.product.name),
+    ("Stock théorique", lambda r: r.Inventory.quantity),
+    ("Stock physique", lambda r: r.physical_qty if r.physical_qty is not None else 0),
+]
 
 
 def get_current_stock():
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    query, error = _stock_query()
+    if error:
+        return error
+    if wants_stream():
+        return stream_rows(query, _serialize_stock_row)
+
+    paginated = paginate(query)
+
+    return (
+        jsonify(
+            {
+                "data": [_serialize_stock_row(item) for item in paginated["items"]],
+                "total": paginated["total"],
+            }
+        ),
+        200,
+    )
+
+
+def _serialize_stock_row(item):
+    return {
+        "product_id": item.Inventory.product_id,
+        "product_name": item.Inventory.product.name,
+        "product_code": item.Inventory.product.code,
+        "theoretical_qty": item.Inventory.quantity,
+        "physical_qty": item.physical_qty if item.physical_qty is not None else 0,
+    }
+
+
+def export_stock():
+    query, error = _stock_query()
+    if error:
+        return error
+    return export_response(query, "stock", STOCK_EXPORT_COLUMNS)
+
+
+def _stock_query():
+    """(query, error response) for the get_current_stock args."""
+    principal = get_principal()
     dist_id = request.args.get("distributor_id", type=int)
     search = request.args.get("search", "")
 
     # 🔹 SCOPING: Use the junction relationship
-    if user.role == "superviseur":
-        assigned_ids = [d.id for d in user.supervised_distributors]
+    if principal.role == "superviseur":
+        assigned_ids = principal.distributor_ids
         if not assigned_ids:
-            return jsonify({"data": [], "message": "Aucun distributeur assigné"}), 200
+            return None, (
+                jsonify({"data": [], "message": "Aucun distributeur assigné"}),
+                200,
+            )
         if not dist_id or dist_id not in assigned_ids:
-            dist_id = assigned_ids[0]
+            dist_id = principal.default_distributor_id
 
     if not dist_id:
-        return jsonify({"data": [], "message": "Distributeur requis"}), 400
+        return None, (jsonify({"data": [], "message": "Distributeur requis"}), 400)
 
+    # Product comes from the join, not one lazy load per row
     query = (
         db.session.query(Inventory, PhysicalInventory.quantity.label("physical_qty"))
         .join(Product, Inventory.product_id == Product.id)
@@ -43,6 +95,7 @@ def get_current_stock():
                 PhysicalInventory.product_id == Inventory.product_id,
             ),
         )
+        .options(contains_eager(Inventory.product))
         .filter(Inventory.distributor_id == dist_id)
     )
 
@@ -51,38 +104,17 @@ def get_current_stock():
             or_(Product.name.ilike(f"%{search}%"), Product.code.ilike(f"%{search}%"))
         )
 
-    paginated = paginate(query.order_by(Product.name.asc()))
-
-    return (
-        jsonify(
-            {
-                "data": [
-                    {
-                        "product_id": item.Inventory.product_id,
-                        "product_name": item.Inventory.product.name,
-                        "product_code": item.Inventory.product.code,
-                        "theoretical_qty": item.Inventory.quantity,
-                        "physical_qty": (
-                            item.physical_qty if item.physical_qty is not None else 0
-                        ),
-                    }
-                    for item in paginated["items"]
-                ],
-                "total": paginated["total"],
-            }
-        ),
-        200,
-    )
+    return query.order_by(Product.name.asc()), None
 
 
 def adjust_stock():
     uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     data = request.json
     dist_id = data.get("distributor_id")
 
     # 🔹 SECURITY CHECK
-    if not user.has_distributor(dist_id):
+    if not principal.has_distributor(dist_id):
         return jsonify({"message": "Accès non autorisé à ce distributeur"}), 403
 
     try:
@@ -100,6 +132,7 @@ def adjust_stock():
         db.session.add(adj)
         update_stock_incremental(dist_id, prod_id, qty)
         db.session.commit()
+        broker.publish("inventory", dist_id, product_id=prod_id)
         return jsonify({"message": "Ajustement enregistré"}), 201
     except Exception as e:
         db.session.rollback()
@@ -107,18 +140,18 @@ def adjust_stock():
 
 
 def delete_adjustment(adj_id):
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     adj = StockAdjustment.query.get_or_404(adj_id)
 
     # 🔹 SECURITY CHECK
-    if not user.has_distributor(adj.distributor_id):
+    if not principal.has_distributor(adj.distributor_id):
         return jsonify({"message": "Action non autorisée"}), 403
 
     try:
         update_stock_incremental(adj.distributor_id, adj.product_id, -adj.quantity)
         db.session.delete(adj)
         db.session.commit()
+        broker.publish("inventory", adj.distributor_id, product_id=adj.product_id)
         return jsonify({"message": "Ajustement supprimé"}), 200
     except Exception as e:
         db.session.rollback()
@@ -126,11 +159,10 @@ def delete_adjustment(adj_id):
 
 
 def get_history(dist_id, prod_id):
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
 
     # 🔹 SECURITY CHECK
-    if not user.has_distributor(dist_id):
+    if not principal.has_distributor(dist_id):
         return jsonify({"message": "Accès non autorisé"}), 403
 
     move_type = request.args.get("type")
@@ -151,36 +183,50 @@ def get_history(dist_id, prod_id):
     if end_date:
         query = query.filter(InventoryHistoryView.created_at <= f"{end_date} 23:59:59")
 
-    paginated = paginate(query.order_by(InventoryHistoryView.created_at.desc()))
+    query = query.order_by(InventoryHistoryView.created_at.desc())
+    if wants_stream():
+        return stream_rows(query, _serialize_history_row)
+
+    paginated = paginate(
+        query,
+        keyset=(
+            InventoryHistoryView.created_at,
+            InventoryHistoryView.type,
+            InventoryHistoryView.ref_id,
+        ),
+        descending=True,
+        count="window",
+    )
     return (
         jsonify(
             {
-                "data": [
-                    {
-                        "id": h.ref_id,
-                        "date": h.created_at.isoformat(),
-                        "type": h.type,
-                        "quantity": h.quantity,
-                        "actor": h.actor_name,
-                        "note": h.note,
-                    }
-                    for h in paginated["items"]
-                ],
+                "data": [_serialize_history_row(h) for h in paginated["items"]],
                 "total": paginated["total"],
+                "next_cursor": paginated["next_cursor"],
             }
         ),
         200,
     )
 
 
+def _serialize_history_row(h):
+    return {
+        "id": h.ref_id,
+        "date": h.created_at.isoformat(),
+        "type": h.type,
+        "quantity": h.quantity,
+        "actor": h.actor_name,
+        "note": h.note,
+    }
+
+
 def refresh_inventory():
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     data = request.json
     dist_id = data.get("distributor_id")
 
     # 🔹 SECURITY CHECK
-    if not user.has_distributor(dist_id):
+    if not principal.has_distributor(dist_id):
         return jsonify({"message": "Action non autorisée"}), 403
 
     try:
@@ -189,6 +235,7 @@ def refresh_inventory():
             {"d_id": dist_id},
         )
         db.session.commit()
+        broker.publish("inventory", dist_id)
         return jsonify({"message": "Inventaire théorique synchronisé"}), 200
     except Exception as e:
         db.session.rollback()
@@ -196,13 +243,12 @@ def refresh_inventory():
 
 
 def upsert_physical_inventory():
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     data = request.json
     dist_id = data.get("distributor_id")
 
     # 🔹 SECURITY CHECK
-    if not user.has_distributor(dist_id):
+    if not principal.has_distributor(dist_id):
         return jsonify({"message": "Action non autorisée"}), 403
 
     try:
@@ -219,6 +265,7 @@ def upsert_physical_inventory():
         else:
             physical.quantity = data["quantity"]
         db.session.commit()
+        broker.publish("inventory", dist_id, product_id=data["product_id"])
         return jsonify({"message": "Inventaire physique enregistré"}), 200
     except Exception as e:
         db.session.rollback()
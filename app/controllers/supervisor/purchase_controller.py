@@ -5,30 +5,44 @@ from sqlalchemy.orm import joinedload
 from decimal import Decimal
 from datetime import datetime
 from app.extensions import db
-from app.models import Purchase, PurchaseItem, PurchaseView, Product, User, Distributor
+from app.models import Purchase, PurchaseItem, PurchaseView, Product, Distributor
 from app.utils.stock_ops import update_stock_incremental
-from app.utils.pagination import paginate
+from app.utils.pagination import paginate, wants_stream, stream_rows
+from app.utils.principal import get_principal
+from app.utils.scoping import scope_to_supervisor
+from app.utils.events import broker
+from app.utils.exports import export_response
 
+# Columns of the export: (header, row -> value)
+PURCHASE_EXPORT_COLUMNS = [
+    ("ID", lambda p: p.id),
+    ("Date", lambda p: p.date),
+    ("Distributeur", lambda p: p.distributor_name),
+    ("Montant total", lambda p: float(p.total_amount or 0)),
+    ("Statut", lambda p: p.status),
+]
 
-def list_purchases():
-    uid = get_jwt_identity()
-    user = User.query.get_or_404(uid)
-    query = PurchaseView.query
 
-    # 🔹 SCOPING: Use the junction table
-    if user.role == "superviseur":
-        dist_ids = [d.id for d in user.supervised_distributors]
-        query = query.filter(PurchaseView.distributor_id.in_(dist_ids))
-
-    search = request.args.get("search")
-    if search:
-        query = query.filter(PurchaseView.id.ilike(f"%{search}%"))
-
-    distributor_id = request.args.get("distributor_id")
-    if distributor_id and distributor_id != "all":
-        query = query.filter(PurchaseView.distributor_id == distributor_id)
+def list_purchases():
+    if wants_stream():
+        # Purchase rows joined with their lines, one group of rows per purchase
+        lines = (
+            _purchases_query()
+            .add_columns(
+                PurchaseItem.product_id,
+                Product.name.label("product_name"),
+                PurchaseItem.quantity,
+                Product.price_factory,
+            )
+            .outerjoin(PurchaseItem, PurchaseItem.purchase_id == PurchaseView.id)
+            .outerjoin(Product, Product.id == PurchaseItem.product_id)
+            .order_by(PurchaseView.id.desc())
+        )
+        return stream_rows(
+            lines, _serialize_purchase_lines, group_by=lambda r: r.PurchaseView.id
+        )
 
-    paginated = paginate(query.order_by(PurchaseView.date.desc()))
+    paginated = paginate(_purchases_query(), count="window")
     purchase_ids = [p.id for p in paginated["items"]]
     actual_purchases = (
         Purchase.query.options(
@@ -42,40 +56,89 @@ def list_purchases():
     results = []
     for p_view in paginated["items"]:
         full_purchase = purchase_map.get(p_view.id)
-        product_list = []
-        if full_purchase:
-            for item in full_purchase.items:
-                product_list.append(
-                    {
-                        "product_id": item.product_id,
-                        "name": item.product.name,
-                        "quantity": item.quantity,
-                        "price_factory": float(item.product.price_factory or 0),
-                    }
-                )
+        items = full_purchase.items if full_purchase else []
         results.append(
-            {
-                "id": p_view.id,
-                "date": p_view.date.isoformat(),
-                "distributor_name": p_view.distributor_name,
-                "distributor_id": p_view.distributor_id,
-                "total_amount": float(p_view.total_amount or 0),
-                "status": p_view.status,
-                "products": product_list,
-            }
+            _serialize_purchase(
+                p_view,
+                [
+                    _serialize_line(
+                        i.product_id,
+                        i.product.name,
+                        i.quantity,
+                        i.product.price_factory,
+                    )
+                    for i in items
+                ],
+            )
         )
 
     return jsonify({"data": results, "total": paginated["total"]}), 200
 
 
+def _serialize_purchase(p_view, products):
+    return {
+        "id": p_view.id,
+        "date": p_view.date.isoformat(),
+        "distributor_name": p_view.distributor_name,
+        "distributor_id": p_view.distributor_id,
+        "total_amount": float(p_view.total_amount or 0),
+        "status": p_view.status,
+        "products": products,
+    }
+
+
+def _serialize_line(product_id, name, quantity, price_factory):
+    return {
+        "product_id": product_id,
+        "name": name,
+        "quantity": quantity,
+        "price_factory": float(price_factory or 0),
+    }
+
+
+def _serialize_purchase_lines(rows):
+    """One purchase from its joined (view, line) rows, see list_purchases."""
+    return _serialize_purchase(
+        rows[0].PurchaseView,
+        [
+            _serialize_line(r.product_id, r.product_name, r.quantity, r.price_factory)
+            for r in rows
+            if r.product_id is not None
+        ],
+    )
+
+
+def export_purchases():
+    return export_response(_purchases_query(), "achats", PURCHASE_EXPORT_COLUMNS)
+
+
+def _purchases_query():
+    """vw_purchases_list filtered by the list_purchases args, newest first."""
+    principal = get_principal()
+    query = PurchaseView.query
+
+    # 🔹 SCOPING: Use the junction table
+    query = scope_to_supervisor(query, PurchaseView.distributor_id, principal)
+
+    search = request.args.get("search")
+    if search:
+        query = query.filter(PurchaseView.id.ilike(f"%{search}%"))
+
+    distributor_id = request.args.get("distributor_id")
+    if distributor_id and distributor_id != "all":
+        query = query.filter(PurchaseView.distributor_id == distributor_id)
+
+    return query.order_by(PurchaseView.date.desc())
+
+
 def create_purchase():
     uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     data = request.json
     dist_id = data["distributor_id"]
 
     # 🔹 SECURITY CHECK
-    if not user.has_distributor(dist_id):
+    if not principal.has_distributor(dist_id):
         return jsonify({"message": "Accès non autorisé à ce distributeur"}), 403
 
     new_purchase = Purchase(
@@ -99,17 +162,22 @@ def create_purchase():
     new_purchase.total_amount = total
     db.session.add(new_purchase)
     db.session.commit()
+    broker.publish(
+        "purchases",
+        dist_id,
+        purchase_id=new_purchase.id,
+        stock=new_purchase.status == "complete",
+    )
     return jsonify({"message": "Achat enregistré", "id": new_purchase.id}), 201
 
 
 def update_purchase(purchase_id):
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     purchase = Purchase.query.get_or_404(purchase_id)
     data = request.json
 
     # 🔹 SECURITY CHECK
-    if not user.has_distributor(purchase.distributor_id):
+    if not principal.has_distributor(purchase.distributor_id):
         return jsonify({"message": "Action non autorisée"}), 403
 
     try:
@@ -140,6 +208,12 @@ def update_purchase(purchase_id):
                 )
 
         db.session.commit()
+        broker.publish(
+            "purchases",
+            purchase.distributor_id,
+            purchase_id=purchase.id,
+            stock=old_status == "complete" or new_status == "complete",
+        )
         return jsonify({"message": "Achat mis à jour"}), 200
     except Exception as e:
         db.session.rollback()
@@ -147,8 +221,7 @@ def update_purchase(purchase_id):
 
 
 def get_purchase_matrix():
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     purchase_id = request.args.get("purchase_id", type=int)
     search = request.args.get("search", "")
     cat = request.args.get("category", "all")
@@ -157,7 +230,7 @@ def get_purchase_matrix():
 
     if purchase_id:
         p = Purchase.query.get(purchase_id)
-        if p and not user.has_distributor(p.distributor_id):
+        if p and not principal.has_distributor(p.distributor_id):
             return jsonify({"message": "Action non autorisée"}), 403
 
     query = db.session.query(Product).filter(Product.active == True)
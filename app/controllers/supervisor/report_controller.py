@@ -0,0 +1,105 @@
+from flask import request, jsonify, send_file
+from flask_jwt_extended import get_jwt_identity
+from app.utils.principal import get_principal, GLOBAL_ROLES
+from app.utils.reports import reports, REPORTS, ReportError, DONE
+
+
+def list_report_definitions():
+    return (
+        jsonify(
+            [
+                {
+                    "name": d.name,
+                    "title": d.title,
+                    "columns": [header for header, _ in d.columns],
+                }
+                for d in REPORTS.values()
+            ]
+        ),
+        200,
+    )
+
+
+def request_report():
+    principal = get_principal()
+    data = request.json or {}
+    params = dict(data.get("params") or {})
+
+    # 🔹 SCOPING: supervisors only report on their assigned distributors
+    requested = params.get("distributor_ids")
+    try:
+        requested = sorted({int(d) for d in requested}) if requested else None
+    except (TypeError, ValueError):
+        return jsonify({"message": "Liste de distributeurs invalide"}), 400
+    if principal.role not in GLOBAL_ROLES:
+        assigned = principal.distributor_ids
+        if requested is None:
+            requested = sorted(assigned)
+        elif not set(requested) <= assigned:
+            return jsonify({"message": "Accès non autorisé à ce distributeur"}), 403
+    params["distributor_ids"] = requested
+
+    try:
+        job = reports.submit(
+            data.get("report"), params, data.get("format", "csv"), get_jwt_identity()
+        )
+    except ReportError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify(_job_dict(job)), 200 if job["status"] == DONE else 202
+
+
+def get_report_status(job_id):
+    job, error = _get_job(job_id)
+    if error:
+        return error
+    return jsonify(_job_dict(job)), 200
+
+
+def download_report(job_id):
+    job, error = _get_job(job_id)
+    if error:
+        return error
+    if job["status"] != DONE:
+        return jsonify({"message": "Rapport pas encore disponible"}), 409
+
+    # Opened here: retention cleanup may have deleted the file since the
+    # status was read
+    try:
+        output = open(reports.output_path(job), "rb")
+    except FileNotFoundError:
+        return jsonify({"message": "Rapport expiré, relancez-le"}), 410
+
+    return send_file(
+        output,
+        as_attachment=True,
+        download_name=f"{job['report']}_{job['id'][:8]}.{job['format']}",
+    )
+
+
+def _get_job(job_id):
+    job = reports.status(job_id)
+    if job is None:
+        return None, (jsonify({"message": "Rapport introuvable ou expiré"}), 404)
+
+    # 🔹 SECURITY CHECK: the job's scope must be within the caller's
+    principal = get_principal()
+    scope = job["params"]["distributor_ids"]
+    if principal.role not in GLOBAL_ROLES and (
+        scope is None or not set(scope) <= principal.distributor_ids
+    ):
+        return None, (jsonify({"message": "Accès non autorisé"}), 403)
+    return job, None
+
+
+def _job_dict(job):
+    return {
+        "id": job["id"],
+        "report": job["report"],
+        "params": job["params"],
+        "format": job["format"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "rows": job["rows"],
+        "error": job["error"],
+    }
@@ -2,24 +2,66 @@ from flask import request, jsonify
 from flask_jwt_extended import get_jwt_identity
 from sqlalchemy.orm import joinedload
 from sqlalchemy import or_, and_, case
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
 from app.extensions import db
-from app.models import Sale, SaleItem, User, Product, SaleView, Vendor, Distributor
+from app.models import Sale, SaleItem, Product, SaleView, Vendor, Distributor
 from app.utils.stock_ops import update_stock_incremental
-from app.utils.pagination import paginate
+from app.utils.pagination import paginate, wants_stream, stream_rows
+from app.utils.principal import get_principal
+from app.utils.scoping import scope_to_supervisor
+from app.utils.dates import week_dates
+from app.utils.events import broker
+from app.utils.exports import export_response
+
+# Columns of the export: (header, row -> value)
+SALE_EXPORT_COLUMNS = [
+    ("ID", lambda s: s.id),
+    ("Date", lambda s: s.date),
+    ("Distributeur", lambda s: s.distributor_name),
+    ("Vendeur", lambda s: f"{s.vendor_first_name} {s.vendor_last_name}"),
+    ("Type vendeur", lambda s: s.vendor_type),
+    ("Montant total", lambda s: float(s.total_amount or 0)),
+    ("Statut", lambda s: s.status),
+]
 
 
 def list_sales():
-    uid = get_jwt_identity()
-    user = User.query.get_or_404(uid)
+    query = _sales_query()
+    if wants_stream():
+        return stream_rows(query, _serialize_sale_row)
+
+    paginated = paginate(
+        query,
+        keyset=(SaleView.date, SaleView.id),
+        descending=True,
+        count="cached",
+    )
+
+    return (
+        jsonify(
+            {
+                "data": [_serialize_sale_row(s) for s in paginated["items"]],
+                "total": paginated["total"],
+                "next_cursor": paginated["next_cursor"],
+            }
+        ),
+        200,
+    )
+
+
+def export_sales():
+    return export_response(_sales_query(), "ventes", SALE_EXPORT_COLUMNS)
+
+
+def _sales_query():
+    """vw_sales_list filtered by the list_sales args, newest first."""
+    principal = get_principal()
 
     query = SaleView.query
 
     # 🔹 SCOPING: Filter by distributors the supervisor is assigned to (Many-to-Many)
-    if user.role == "superviseur":
-        dist_ids = [d.id for d in user.supervised_distributors]
-        query = query.filter(SaleView.distributor_id.in_(dist_ids))
+    query = scope_to_supervisor(query, SaleView.distributor_id, principal)
 
     # Date filters
     start_date = request.args.get("startDate")
@@ -40,28 +82,24 @@ def list_sales():
             )
         )
 
-    paginated = paginate(query.order_by(SaleView.date.desc(), SaleView.id.desc()))
+    return query.order_by(SaleView.date.desc(), SaleView.id.desc())
 
-    results = []
-    for s in paginated["items"]:
-        results.append(
-            {
-                "id": s.id,
-                "date": s.date.isoformat() if s.date else None,
-                "distributor_name": s.distributor_name,
-                "vendor_name": f"{s.vendor_first_name} {s.vendor_last_name}",
-                "vendor_type": s.vendor_type,
-                "total_amount": float(s.total_amount or 0),
-                "status": s.status,
-            }
-        )
 
-    return jsonify({"data": results, "total": paginated["total"]}), 200
+def _serialize_sale_row(s):
+    return {
+        "id": s.id,
+        "date": s.date.isoformat() if s.date else None,
+        "distributor_name": s.distributor_name,
+        "vendor_name": f"{s.vendor_first_name} {s.vendor_last_name}",
+        "vendor_type": s.vendor_type,
+        "total_amount": float(s.total_amount or 0),
+        "status": s.status,
+    }
 
 
 def upsert_sale_item():
     uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     data = request.json
 
     v_id = data.get("vendor_id")
@@ -72,7 +110,7 @@ def upsert_sale_item():
     vendor = Vendor.query.get_or_404(v_id)
 
     # 🔹 SECURITY CHECK: Many-to-Many access verification
-    if not user.has_distributor(vendor.distributor_id):
+    if not principal.has_distributor(vendor.distributor_id):
         return jsonify({"message": "Accès non autorisé à ce distributeur"}), 403
 
     try:
@@ -110,6 +148,13 @@ def upsert_sale_item():
         _recalculate_total(sale)
         db.session.commit()
 
+        broker.publish(
+            "sales",
+            vendor.distributor_id,
+            vendor_id=vendor.id,
+            date=target_date,
+            stock=sale.status == "complete",
+        )
         return jsonify({"success": True, "new_total": float(sale.total_amount)}), 200
     except Exception as e:
         db.session.rollback()
@@ -117,8 +162,7 @@ def upsert_sale_item():
 
 
 def get_weekly_matrix():
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     start_date_str = request.args.get("start_date")
     vendor_id = request.args.get("vendor_id")
 
@@ -133,21 +177,12 @@ def get_weekly_matrix():
     vendor = Vendor.query.get_or_404(int(vendor_id))
 
     # 🔹 SECURITY CHECK: Many-to-Many access verification
-    if not user.has_distributor(vendor.distributor_id):
+    if not principal.has_distributor(vendor.distributor_id):
         return jsonify({"message": "Accès non autorisé"}), 403
 
-    # Date Logic: Find nearest Saturday
-    raw_date = datetime.fromisoformat(start_date_str).date()
-    weekday = raw_date.weekday()
-    if weekday == 5:  # Saturday
-        start_date = raw_date
-    elif weekday == 6:  # Sunday
-        start_date = raw_date - timedelta(days=1)
-    else:
-        start_date = raw_date - timedelta(days=weekday + 2)
-
-    week_dates = [start_date + timedelta(days=i) for i in range(6)]  # Sam to Jeu
-    end_date = week_dates[-1]
+    # Date Logic: Week runs from the nearest Saturday to Thursday
+    days = week_dates(datetime.fromisoformat(start_date_str).date())
+    start_date, end_date = days[0], days[-1]
 
     sales = Sale.query.filter(
         Sale.vendor_id == vendor.id, Sale.date >= start_date, Sale.date <= end_date
@@ -222,7 +257,7 @@ def get_weekly_matrix():
                 "code": p.code,
                 "active": p.active,
                 "price": float(price or 0),
-                "days": [item_map.get((p.id, d), 0) for d in week_dates],
+                "days": [item_map.get((p.id, d), 0) for d in days],
             }
         )
 
@@ -231,7 +266,7 @@ def get_weekly_matrix():
             {
                 "data": data,
                 "total": total,
-                "dates": [d.isoformat() for d in week_dates],
+                "dates": [d.isoformat() for d in days],
                 "statuses": status_map,
             }
         ),
@@ -241,7 +276,7 @@ def get_weekly_matrix():
 
 def update_sale_status_by_date():
     uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     data = request.json
     v_id = data.get("vendor_id")
     target_date = data.get("date")
@@ -250,7 +285,7 @@ def update_sale_status_by_date():
     vendor = Vendor.query.get_or_404(v_id)
 
     # 🔹 SECURITY CHECK
-    if not user.has_distributor(vendor.distributor_id):
+    if not principal.has_distributor(vendor.distributor_id):
         return jsonify({"message": "Action non autorisée"}), 403
 
     try:
@@ -283,6 +318,13 @@ def update_sale_status_by_date():
             sale.status = new_status
 
         db.session.commit()
+        broker.publish(
+            "sales",
+            vendor.distributor_id,
+            vendor_id=vendor.id,
+            date=target_date,
+            stock=True,
+        )
         return jsonify({"message": "Statut mis à jour"}), 200
     except Exception as e:
         db.session.rollback()
@@ -291,10 +333,11 @@ def update_sale_status_by_date():
 
 def bulk_upsert_sale_items():
     uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     changes = request.json
 
     try:
+        touched_dists = set()
         grouped_sales = {}
         for c in changes:
             key = (c["vendor_id"], c["date"])
@@ -305,7 +348,7 @@ def bulk_upsert_sale_items():
         for (v_id, target_date), items in grouped_sales.items():
             vendor = Vendor.query.get(v_id)
             # 🔹 SECURITY CHECK: Skip unauthorized vendors
-            if not vendor or not user.has_distributor(vendor.distributor_id):
+            if not vendor or not principal.has_distributor(vendor.distributor_id):
                 continue
 
             sale = Sale.query.filter_by(vendor_id=v_id, date=target_date).first()
@@ -344,8 +387,11 @@ def bulk_upsert_sale_items():
 
             db.session.flush()
             _recalculate_total(sale)
+            touched_dists.add(vendor.distributor_id)
 
         db.session.commit()
+        for dist_id in touched_dists:
+            broker.publish("sales", dist_id, stock=True)
         return jsonify({"success": True, "message": "Ventes mises à jour"}), 200
     except Exception as e:
         db.session.rollback()
@@ -1,30 +1,30 @@
 from flask import request, jsonify
 from flask_jwt_extended import get_jwt_identity
 from app.extensions import db
-from app.models import Vendor, User, Distributor
-from app.utils.pagination import paginate
+from app.models import Vendor, Distributor, Sale, Visit
+from app.utils.pagination import paginate, wants_stream, stream_rows
+from app.utils.principal import get_principal
+from app.utils.cache import versions
+from app.utils.scoping import scope_to_supervisor
+from app.utils.dependency_checks import has_dependents
 from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
 
 
 def list_vendors():
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
 
-    query = Vendor.query
+    query = Vendor.query.options(joinedload(Vendor.distributor))
 
     # 🔹 SCOPING: Filter by distributors the supervisor is assigned to
-    if user.role == "superviseur":
-        dist_ids = [d.id for d in user.supervised_distributors]
-        query = query.filter(Vendor.distributor_id.in_(dist_ids))
+    query = scope_to_supervisor(query, Vendor.distributor_id, principal)
 
     # Filters
     dist_id = request.args.get("distributor_id")
     if dist_id and dist_id != "all":
         # Additional security check: if a specific dist_id is requested,
         # ensure supervisor has access to it.
-        if user.role == "superviseur" and int(dist_id) not in [
-            d.id for d in user.supervised_distributors
-        ]:
+        if principal.role == "superviseur" and not principal.has_distributor(dist_id):
             return jsonify({"message": "Accès non autorisé à ce distributeur"}), 403
         query = query.filter_by(distributor_id=dist_id)
 
@@ -42,26 +42,16 @@ def list_vendors():
             )
         )
 
-    paginated = paginate(query.order_by(Vendor.id.desc()))
+    query = query.order_by(Vendor.id.desc())
+    if wants_stream():
+        return stream_rows(query, _serialize_vendor)
+
+    paginated = paginate(query)
 
     return (
         jsonify(
             {
-                "data": [
-                    {
-                        "id": v.id,
-                        "code": v.code,
-                        "first_name": v.first_name,
-                        "last_name": v.last_name,
-                        "type": v.vendor_type,
-                        "active": v.active,
-                        "distributor_name": (
-                            v.distributor.name if v.distributor else "N/A"
-                        ),
-                        "distributor_id": v.distributor_id,
-                    }
-                    for v in paginated["items"]
-                ],
+                "data": [_serialize_vendor(v) for v in paginated["items"]],
                 "total": paginated["total"],
             }
         ),
@@ -69,15 +59,28 @@ def list_vendors():
     )
 
 
+def _serialize_vendor(v):
+    return {
+        "id": v.id,
+        "code": v.code,
+        "first_name": v.first_name,
+        "last_name": v.last_name,
+        "type": v.vendor_type,
+        "active": v.active,
+        "distributor_name": v.distributor.name if v.distributor else "N/A",
+        "distributor_id": v.distributor_id,
+    }
+
+
 def create_vendor():
     uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     data = request.json
 
     dist_id = data.get("distributor_id")
 
     # 🔹 SECURITY CHECK: Can this supervisor add a vendor to this distributor?
-    if user.role == "superviseur" and not user.has_distributor(dist_id):
+    if principal.role == "superviseur" and not principal.has_distributor(dist_id):
         return jsonify({"message": "Vous n'êtes pas assigné à ce distributeur"}), 403
 
     try:
@@ -95,6 +98,7 @@ def create_vendor():
         )
         db.session.add(new_vendor)
         db.session.commit()
+        versions.bump(f"vendors:{new_vendor.distributor_id}")
         return (
             jsonify({"message": "Vendeur créé avec succès", "id": new_vendor.id}),
             201,
@@ -105,13 +109,14 @@ def create_vendor():
 
 
 def update_vendor(vendor_id):
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     vendor = Vendor.query.get_or_404(vendor_id)
     data = request.json
 
     # 🔹 SECURITY CHECK: Verify access to the vendor's distributor
-    if user.role == "superviseur" and not user.has_distributor(vendor.distributor_id):
+    if principal.role == "superviseur" and not principal.has_distributor(
+        vendor.distributor_id
+    ):
         return jsonify({"message": "Action non autorisée"}), 403
 
     vendor.first_name = data.get("first_name", vendor.first_name)
@@ -120,19 +125,21 @@ def update_vendor(vendor_id):
     vendor.active = data.get("active", vendor.active)
 
     db.session.commit()
+    versions.bump(f"vendors:{vendor.distributor_id}")
     return jsonify({"message": "Vendeur mis à jour avec succès"}), 200
 
 
 def delete_vendor(vendor_id):
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     vendor = Vendor.query.get_or_404(vendor_id)
 
     # 🔹 SECURITY CHECK
-    if user.role == "superviseur" and not user.has_distributor(vendor.distributor_id):
+    if principal.role == "superviseur" and not principal.has_distributor(
+        vendor.distributor_id
+    ):
         return jsonify({"message": "Action non autorisée"}), 403
 
-    if vendor.sales or vendor.visits_activity:
+    if has_dependents(Sale.vendor_id == vendor.id, Visit.vendor_id == vendor.id):
         return (
             jsonify(
                 {
@@ -143,8 +150,10 @@ def delete_vendor(vendor_id):
         )
 
     try:
+        dist_id = vendor.distributor_id
         db.session.delete(vendor)
         db.session.commit()
+        versions.bump(f"vendors:{dist_id}")
         return jsonify({"message": "Vendeur supprimé avec succès"}), 200
     except Exception as e:
         db.session.rollback()
@@ -1,106 +1,285 @@
 from flask import request, jsonify
 from flask_jwt_extended import get_jwt_identity
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, exists, func
 from app.extensions import db
-from app.models import Visit, Vendor, User, Distributor
-from app.utils.pagination import paginate
+from app.models import Visit, Vendor, Distributor
+from app.utils.pagination import paginate, wants_stream, stream_rows
+from app.utils.principal import get_principal
+from app.utils.events import broker
+from app.utils.exports import export_response
+from datetime import datetime, timedelta
+from app.utils.dates import week_dates, week_start
+from app.utils.week_ops import copy_planned_visits, copy_sales_as_draft
+
+# Frontend field names -> Visit attributes (several naming conventions in use)
+VISIT_FIELDS = {
+    "planned": "planned_visits",
+    "prog": "planned_visits",
+    "actual": "actual_visits",
+    "done": "actual_visits",
+    "invoices": "invoice_count",
+    "nb_factures": "invoice_count",
+}
+
+MAX_RANGE_DAYS = 31
+
+# Visit columns of one range matrix cell
+VISIT_CELL_COLUMNS = (
+    Visit.id.label("visit_id"),
+    Visit.date,
+    Visit.planned_visits,
+    Visit.actual_visits,
+    Visit.invoice_count,
+)
+
+# Columns of the visit matrix export: (header, row -> value)
+VISIT_EXPORT_COLUMNS = [
+    ("Code vendeur", lambda r: r.code),
+    ("Vendeur", lambda r: f"{r.first_name} {r.last_name}"),
+    ("Type vendeur", lambda r: r.vendor_type),
+    ("Actif", lambda r: "oui" if r.active else "non"),
+    ("Visites prévues", lambda r: r.planned_visits or 0),
+    ("Visites effectuées", lambda r: r.actual_visits or 0),
+    ("Factures", lambda r: r.invoice_count or 0),
+]
 
 
 def get_visit_matrix():
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    query, dist_id, error = _visit_matrix_query()
+    if error:
+        return error
+    if wants_stream():
+        return stream_rows(
+            query, _serialize_matrix_row, extra={"current_distributor": dist_id}
+        )
+
+    # Page + total in one round trip (COUNT(*) OVER ())
+    paginated = paginate(query, count="window")
+    data = [_serialize_matrix_row(r) for r in paginated["items"]]
+
+    return (
+        jsonify(
+            {"data": data, "total": paginated["total"], "current_distributor": dist_id}
+        ),
+        200,
+    )
+
+
+def _serialize_matrix_row(r):
+    return {
+        "vendor_id": r.id,
+        "vendor_name": f"{r.first_name} {r.last_name}",
+        "vendor_code": r.code,
+        "vendor_type": r.vendor_type,
+        "planned": r.planned_visits or 0,
+        "actual": r.actual_visits or 0,
+        "invoices": r.invoice_count or 0,
+        "visit_id": r.visit_id,
+        "active": r.active,
+    }
+
+
+def export_visits():
+    query, _, error = _visit_matrix_query()
+    if error:
+        return error
+    return export_response(query, "visites", VISIT_EXPORT_COLUMNS)
+
+
+def _visit_matrix_query():
+    """
+    (query, distributor id, error response) for the get_visit_matrix args:
+    the distributor's vendors with their visit row for `date`.
+    """
+    principal = get_principal()
     dist_id = request.args.get("distributor_id", type=int)
     target_date = request.args.get("date")
 
     if not target_date:
-        return jsonify({"message": "Date requise"}), 400
-
-    # 🔹 SCOPING: Get assigned distributors from the junction table
-    if user and user.role == "superviseur":
-        assigned_ids = [d.id for d in user.supervised_distributors]
-
-        if not assigned_ids:
-            return jsonify({"data": [], "message": "Aucun distributeur assigné"}), 200
+        return None, None, (jsonify({"message": "Date requise"}), 400)
 
-        # Default to the first assigned distributor if none specified
-        if not dist_id:
-            dist_id = assigned_ids[0]
+    dist_id, error = _resolve_distributor(principal, dist_id)
+    if error:
+        return None, None, error
 
-        # 🔹 SECURITY: Ensure requested distributor is in the supervisor's list
-        if dist_id not in assigned_ids:
-            return jsonify({"message": "Accès non autorisé à ce distributeur"}), 403
+    try:
+        target_date = _parse_date(target_date)
+    except ValueError:
+        return None, None, (jsonify({"message": "Format de date invalide"}), 400)
 
     search = request.args.get("search", "")
     v_type = request.args.get("vendor_type", "all")
 
-    # Base query: Join vendors with their visit data for the specific date
-    vendor_query = (
-        db.session.query(Vendor)
-        .outerjoin(Visit, and_(Visit.vendor_id == Vendor.id, Visit.date == target_date))
-        .filter(Vendor.distributor_id == dist_id)
+    # Duplicate visit rows for a vendor and date are possible: keep the latest
+    latest_visit = (
+        db.session.query(Visit.vendor_id, func.max(Visit.id).label("id"))
+        .filter(Visit.date == target_date)
+        .group_by(Visit.vendor_id)
+        .subquery()
     )
 
-    if search:
-        vendor_query = vendor_query.filter(
-            or_(
-                Vendor.last_name.ilike(f"%{search}%"),
-                Vendor.first_name.ilike(f"%{search}%"),
-                Vendor.code.ilike(f"%{search}%"),
-            )
+    # Vendor columns + their visit row for the date, in a single statement
+    query = (
+        db.session.query(
+            Vendor.id,
+            Vendor.first_name,
+            Vendor.last_name,
+            Vendor.code,
+            Vendor.vendor_type,
+            Vendor.active,
+            Visit.id.label("visit_id"),
+            Visit.planned_visits,
+            Visit.actual_visits,
+            Visit.invoice_count,
         )
+        .outerjoin(latest_visit, latest_visit.c.vendor_id == Vendor.id)
+        .outerjoin(Visit, Visit.id == latest_visit.c.id)
+        .filter(Vendor.distributor_id == dist_id)
+    )
 
-    if v_type != "all":
-        vendor_query = vendor_query.filter(Vendor.vendor_type == v_type)
+    query = _filter_vendors(query, search, v_type)
 
     # Show vendor if ACTIVE or if they already have data for this date
-    vendor_query = vendor_query.filter(or_(Vendor.active == True, Visit.id.isnot(None)))
-    vendor_query = vendor_query.distinct()
+    query = query.filter(or_(Vendor.active == True, Visit.id.isnot(None)))
 
-    paginated = paginate(vendor_query.order_by(Vendor.last_name.asc()))
+    return query.order_by(Vendor.last_name.asc(), Vendor.id.asc()), dist_id, None
 
+
+def get_visit_range_matrix():
+    """
+    Vendor x day grid of planned/actual/invoice counts for a date range.
+    Without `end_date` the range is the work week (Saturday -> Thursday) of
+    `start_date`, like the sales weekly matrix. Edits go through bulk-upsert.
+    """
+    principal = get_principal()
+    dist_id = request.args.get("distributor_id", type=int)
+    start_str = request.args.get("start_date")
+    end_str = request.args.get("end_date")
+
+    if not start_str:
+        return jsonify({"message": "Date de début requise"}), 400
+
+    dist_id, error = _resolve_distributor(principal, dist_id)
+    if error:
+        return error
+
+    try:
+        if end_str:
+            start_date, end_date = _parse_date(start_str), _parse_date(end_str)
+            days = [
+                start_date + timedelta(days=i)
+                for i in range((end_date - start_date).days + 1)
+            ]
+        else:
+            days = week_dates(_parse_date(start_str))
+            start_date, end_date = days[0], days[-1]
+    except ValueError:
+        return jsonify({"message": "Format de date invalide"}), 400
+
+    if not days or len(days) > MAX_RANGE_DAYS:
+        return (
+            jsonify({"message": f"Période invalide (max {MAX_RANGE_DAYS} jours)"}),
+            400,
+        )
+
+    search = request.args.get("search", "")
+    v_type = request.args.get("vendor_type", "all")
+
+    in_range = and_(
+        Visit.vendor_id == Vendor.id,
+        Visit.date >= start_date,
+        Visit.date <= end_date,
+    )
+    query = db.session.query(
+        Vendor.id,
+        Vendor.first_name,
+        Vendor.last_name,
+        Vendor.code,
+        Vendor.vendor_type,
+        Vendor.active,
+    ).filter(Vendor.distributor_id == dist_id)
+    query = _filter_vendors(query, search, v_type)
+
+    # Show vendor if ACTIVE or if they already have data in the range
+    has_visits = exists().where(in_range).correlate(Vendor)
+    query = query.filter(or_(Vendor.active == True, has_visits))
+    query = query.order_by(Vendor.last_name.asc(), Vendor.id.asc())
+    extra = {"dates": [d.isoformat() for d in days], "current_distributor": dist_id}
+
+    if wants_stream():
+        # Vendor rows joined with their visits, one group of rows per vendor.
+        # Duplicate visits of a day: the highest id wins, as in the day matrix
+        lines = (
+            query.add_columns(*VISIT_CELL_COLUMNS)
+            .outerjoin(Visit, in_range)
+            .order_by(Visit.id.asc())
+        )
+        return stream_rows(
+            lines,
+            lambda rows: _serialize_range_row(
+                rows[0], {r.date: r for r in rows if r.visit_id is not None}, days
+            ),
+            group_by=lambda r: r.id,
+            extra=extra,
+        )
+
+    paginated = paginate(query, count="window")
     vendors = paginated["items"]
-    vendor_ids = [v.id for v in vendors]
-
-    # Fetch visit rows for the vendors in the current page
-    visits = Visit.query.filter(
-        and_(Visit.date == target_date, Visit.vendor_id.in_(vendor_ids))
-    ).all()
-    visit_map = {v.vendor_id: v for v in visits}
-
-    data = []
-    for v in vendors:
-        visit = visit_map.get(v.id)
-        data.append(
+
+    # One range scan of visits for the vendors on this page, by id so the
+    # latest of duplicate visits of a day is kept (as in the day matrix)
+    cells = {}
+    if vendors:
+        visits = (
+            db.session.query(Visit.vendor_id, *VISIT_CELL_COLUMNS)
+            .filter(
+                Visit.vendor_id.in_([v.id for v in vendors]),
+                Visit.date >= start_date,
+                Visit.date <= end_date,
+            )
+            .order_by(Visit.id.asc())
+        )
+        for cell in visits:
+            cells.setdefault(cell.vendor_id, {})[cell.date] = cell
+
+    data = [_serialize_range_row(v, cells.get(v.id, {}), days) for v in vendors]
+    return jsonify({"data": data, "total": paginated["total"], **extra}), 200
+
+
+def _serialize_range_row(v, cells, days):
+    """Vendor `v` with one entry per day, from its visit `cells` by date."""
+    row_days = []
+    for d in days:
+        cell = cells.get(d)
+        row_days.append(
             {
-                "vendor_id": v.id,
-                "vendor_name": f"{v.first_name} {v.last_name}",
-                "vendor_code": v.code,
-                "vendor_type": v.vendor_type,
-                "planned": visit.planned_visits if visit else 0,
-                "actual": visit.actual_visits if visit else 0,
-                "invoices": visit.invoice_count if visit else 0,
-                "visit_id": visit.id if visit else None,
-                "active": v.active,
+                "planned": (cell.planned_visits or 0) if cell else 0,
+                "actual": (cell.actual_visits or 0) if cell else 0,
+                "invoices": (cell.invoice_count or 0) if cell else 0,
+                "visit_id": cell.visit_id if cell else None,
             }
         )
-
-    return (
-        jsonify(
-            {"data": data, "total": paginated["total"], "current_distributor": dist_id}
-        ),
-        200,
-    )
+    return {
+        "vendor_id": v.id,
+        "vendor_name": f"{v.first_name} {v.last_name}",
+        "vendor_code": v.code,
+        "vendor_type": v.vendor_type,
+        "active": v.active,
+        "days": row_days,
+    }
 
 
 def upsert_visit():
     uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     data = request.json
 
     vendor = Vendor.query.get_or_404(data["vendor_id"])
 
     # 🔹 SECURITY CHECK: Access to vendor's distributor via junction table helper
-    if user.role == "superviseur" and not user.has_distributor(vendor.distributor_id):
+    if principal.role == "superviseur" and not principal.has_distributor(
+        vendor.distributor_id
+    ):
         return jsonify({"message": "Action non autorisée"}), 403
 
     target_date = data["date"]
@@ -130,66 +309,202 @@ def upsert_visit():
         visit.invoice_count = val
 
     db.session.commit()
+    broker.publish(
+        "visits", vendor.distributor_id, vendor_id=vendor.id, date=target_date
+    )
     return jsonify({"success": True, "visit_id": visit.id}), 200
 
 
 def bulk_upsert_visits():
     uid = get_jwt_identity()
-    user = User.query.get(uid)
+    principal = get_principal()
     changes = request.json
 
     if not isinstance(changes, list):
         return jsonify({"message": "Format invalide, liste attendue"}), 400
 
     processed_count = 0
+    touched_dists = set()
     try:
-        # Group changes by vendor/date to minimize database lookups
+        # Group changes by vendor/date so each visit row is written once
         grouped = {}
         for item in changes:
-            key = (item["vendor_id"], item["date"])
-            if key not in grouped:
-                grouped[key] = []
-            grouped[key].append(item)
+            key = (int(item["vendor_id"]), _parse_date(item["date"]))
+            grouped.setdefault(key, []).append(item)
 
+        if not grouped:
+            return jsonify({"success": True, "processed": 0}), 200
+
+        vendor_ids = {v_id for v_id, _ in grouped}
+        dates = {d for _, d in grouped}
+
+        # 🔹 PREFETCH: all vendors and existing visits in two IN queries
+        vendors = {
+            v.id: v
+            for v in db.session.query(Vendor.id, Vendor.distributor_id).filter(
+                Vendor.id.in_(vendor_ids)
+            )
+        }
+        existing = {
+            (v.vendor_id, v.date): v
+            for v in db.session.query(
+                Visit.id,
+                Visit.vendor_id,
+                Visit.date,
+                Visit.planned_visits,
+                Visit.actual_visits,
+                Visit.invoice_count,
+            ).filter(Visit.vendor_id.in_(vendor_ids), Visit.date.in_(dates))
+        }
+
+        inserts, updates = [], []
         for (v_id, target_date), items in grouped.items():
-            vendor = Vendor.query.get(v_id)
+            vendor = vendors.get(v_id)
             if not vendor:
                 continue
 
-            # 🔹 SECURITY CHECK: Verify access to vendor's distributor
-            if user.role == "superviseur" and not user.has_distributor(
+            # 🔹 SECURITY CHECK: Set lookup against the principal's distributors
+            if principal.role == "superviseur" and not principal.has_distributor(
                 vendor.distributor_id
             ):
                 continue
 
-            visit = Visit.query.filter_by(vendor_id=v_id, date=target_date).first()
-            if not visit:
-                visit = Visit(
-                    date=target_date,
-                    vendor_id=v_id,
-                    distributor_id=vendor.distributor_id,
-                    supervisor_id=uid,
-                    planned_visits=0,
-                    actual_visits=0,
-                    invoice_count=0,
-                )
-                db.session.add(visit)
+            visit = existing.get((v_id, target_date))
+            values = {
+                "planned_visits": visit.planned_visits if visit else 0,
+                "actual_visits": visit.actual_visits if visit else 0,
+                "invoice_count": visit.invoice_count if visit else 0,
+            }
 
             for item in items:
-                field = item["field"]
-                val = int(item.get("value", 0))
-
-                if field in ["planned", "prog"]:
-                    visit.planned_visits = val
-                elif field in ["actual", "done"]:
-                    visit.actual_visits = val
-                elif field in ["invoices", "nb_factures"]:
-                    visit.invoice_count = val
+                attr = VISIT_FIELDS.get(item["field"])
+                if attr:
+                    values[attr] = int(item.get("value", 0))
+
+            if visit:
+                updates.append({"id": visit.id, **values})
+            else:
+                inserts.append(
+                    {
+                        "date": target_date,
+                        "vendor_id": v_id,
+                        "distributor_id": vendor.distributor_id,
+                        "supervisor_id": uid,
+                        **values,
+                    }
+                )
 
             processed_count += 1
+            touched_dists.add(vendor.distributor_id)
+
+        if inserts:
+            db.session.bulk_insert_mappings(Visit, inserts)
+        if updates:
+            db.session.bulk_update_mappings(Visit, updates)
 
         db.session.commit()
+        for dist_id in touched_dists:
+            broker.publish("visits", dist_id)
         return jsonify({"success": True, "processed": processed_count}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": str(e)}), 500
+
+
+def copy_week():
+    """Rolls a week's planned visits (and optionally sales, as drafts) forward."""
+    uid = get_jwt_identity()
+    principal = get_principal()
+    data = request.json or {}
+    dist_id = data.get("distributor_id")
+
+    if not dist_id or not data.get("source_date") or not data.get("target_date"):
+        return jsonify({"message": "Distributeur et semaines requis"}), 400
+
+    # 🔹 SECURITY CHECK
+    if not principal.has_distributor(dist_id):
+        return jsonify({"message": "Accès non autorisé à ce distributeur"}), 403
+
+    try:
+        source_start = week_start(_parse_date(data["source_date"]))
+        target_start = week_start(_parse_date(data["target_date"]))
+    except ValueError:
+        return jsonify({"message": "Format de date invalide"}), 400
+
+    if source_start == target_start:
+        return jsonify({"message": "Les semaines source et cible sont identiques"}), 400
+
+    try:
+        visits = copy_planned_visits(
+            dist_id, source_start, target_start, uid, bool(data.get("overwrite"))
+        )
+        sales, sale_items = 0, 0
+        if data.get("include_sales"):
+            sales, sale_items = copy_sales_as_draft(
+                dist_id, source_start, target_start, uid
+            )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 500
+
+    broker.publish("visits", dist_id, week=target_start.isoformat())
+    if sales:
+        broker.publish("sales", dist_id, week=target_start.isoformat())
+
+    return (
+        jsonify(
+            {
+                "message": "Semaine copiée",
+                "week": target_start.isoformat(),
+                "visits": visits,
+                "sales": sales,
+                "sale_items": sale_items,
+            }
+        ),
+        200,
+    )
+
+
+def _resolve_distributor(principal, dist_id):
+    """Returns (distributor_id, error_response) for the matrix endpoints."""
+    # 🔹 SCOPING: Assigned distributors from the request principal
+    if principal.role == "superviseur":
+        assigned_ids = principal.distributor_ids
+
+        if not assigned_ids:
+            return None, (
+                jsonify({"data": [], "message": "Aucun distributeur assigné"}),
+                200,
+            )
+
+        # Default to the first assigned distributor if none specified
+        if not dist_id:
+            dist_id = principal.default_distributor_id
+
+        # 🔹 SECURITY: Ensure requested distributor is in the supervisor's list
+        if dist_id not in assigned_ids:
+            return None, (
+                jsonify({"message": "Accès non autorisé à ce distributeur"}),
+                403,
+            )
+
+    return dist_id, None
+
+
+def _filter_vendors(query, search, v_type):
+    if search:
+        query = query.filter(
+            or_(
+                Vendor.last_name.ilike(f"%{search}%"),
+                Vendor.first_name.ilike(f"%{search}%"),
+                Vendor.code.ilike(f"%{search}%"),
+            )
+        )
+    if v_type != "all":
+        query = query.filter(Vendor.vendor_type == v_type)
+    return query
+
+
+def _parse_date(value):
+    return datetime.fromisoformat(str(value)).date()
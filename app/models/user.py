@@ -1,5 +1,6 @@
 from app.extensions import db
 from datetime import datetime
+from sqlalchemy.orm import joinedload, selectinload
 
 user_wilayas = db.Table(
     "user_wilayas",
@@ -63,6 +64,19 @@ class User(db.Model):
             return True
         return any(d.id == int(dist_id) for d in self.supervised_distributors)
 
+    @staticmethod
+    def to_dict_options():
+        """
+        Loader options for everything to_dict() reads: region/zone joined in,
+        wilayas and distributors batch-loaded for the whole result set.
+        """
+        return (
+            joinedload(User.region),
+            joinedload(User.zone),
+            selectinload(User.assigned_wilayas),
+            selectinload(User.supervised_distributors),
+        )
+
     def to_dict(self):
         ROLE_GEO_SCOPE = {
             "superviseur": "Wilaya",
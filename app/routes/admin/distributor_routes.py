@@ -34,6 +34,20 @@ def reassign():
     return distributor_controller.bulk_reassign()
 
 
+@distributor_bp.route("/bulk-unassign", methods=["POST"])
+@jwt_required()
+@roles_required("admin")
+def unassign():
+    return distributor_controller.bulk_unassign()
+
+
+@distributor_bp.route("/transfer", methods=["POST"])
+@jwt_required()
+@roles_required("admin")
+def transfer():
+    return distributor_controller.transfer_distributors()
+
+
 @distributor_bp.route("/supervisors", methods=["GET"])
 @jwt_required()
 @roles_required("admin")
@@ -5,6 +5,7 @@ from .visit_routes import visit_bp
 from .inventory_routes import inventory_bp
 from .dashboard_routes import dashboard_bp
 from .vendor_routes import vendor_bp
+from .report_routes import report_bp
 
 supervisor_group_bp = Blueprint("supervisor_group", __name__)
 
@@ -15,4 +16,5 @@ supervisor_group_bp.register_blueprint(inventory_bp, url_prefix="/inventory")
 supervisor_group_bp.register_blueprint(
     dashboard_bp, url_prefix="/dashboard"
 )
-supervisor_group_bp.register_blueprint(vendor_bp, url_prefix="/vendors")
\ No newline at end of file
+supervisor_group_bp.register_blueprint(vendor_bp, url_prefix="/vendors")
+supervisor_group_bp.register_blueprint(report_bp, url_prefix="/reports")
\ No newline at end of file
@@ -9,3 +9,15 @@ dashboard_bp = Blueprint("dashboard", __name__)
 @jwt_required()
 def stats():
     return dashboard_controller.get_stats()
+
+
+@dashboard_bp.route("/trends", methods=["GET"])
+@jwt_required()
+def trends():
+    return dashboard_controller.get_trends()
+
+
+@dashboard_bp.route("/events", methods=["GET"])
+@jwt_required()
+def events():
+    return dashboard_controller.stream_events()
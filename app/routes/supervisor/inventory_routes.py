@@ -11,6 +11,12 @@ def get_stock():
     return inventory_controller.get_current_stock()
 
 
+@inventory_bp.route("/stock/export", methods=["GET"])
+@jwt_required()
+def export_stock():
+    return inventory_controller.export_stock()
+
+
 @inventory_bp.route("/adjust", methods=["POST"])
 @jwt_required()
 def adjust():
@@ -11,6 +11,12 @@ def get_purchases():
     return purchase_controller.list_purchases()
 
 
+@purchase_bp.route("/export", methods=["GET"])
+@jwt_required()
+def export_purchases():
+    return purchase_controller.export_purchases()
+
+
 @purchase_bp.route("", methods=["POST"])
 @jwt_required()
 def add_purchase():
@@ -0,0 +1,29 @@
+from flask import Blueprint
+from flask_jwt_extended import jwt_required
+from app.controllers.supervisor import report_controller
+
+report_bp = Blueprint("reports", __name__)
+
+
+@report_bp.route("/definitions", methods=["GET"])
+@jwt_required()
+def get_definitions():
+    return report_controller.list_report_definitions()
+
+
+@report_bp.route("", methods=["POST"])
+@jwt_required()
+def request_report():
+    return report_controller.request_report()
+
+
+@report_bp.route("/<job_id>", methods=["GET"])
+@jwt_required()
+def get_status(job_id):
+    return report_controller.get_report_status(job_id)
+
+
+@report_bp.route("/<job_id>/download", methods=["GET"])
+@jwt_required()
+def download(job_id):
+    return report_controller.download_report(job_id)
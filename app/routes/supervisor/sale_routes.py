@@ -11,6 +11,12 @@ def get_sales():
     return sale_controller.list_sales()
 
 
+@sale_bp.route("/export", methods=["GET"])
+@jwt_required()
+def export_sales():
+    return sale_controller.export_sales()
+
+
 @sale_bp.route("/matrix", methods=["GET"])
 @jwt_required()
 def get_matrix():
@@ -11,6 +11,12 @@ def get_matrix():
     return visit_controller.get_visit_matrix()
 
 
+@visit_bp.route("/export", methods=["GET"])
+@jwt_required()
+def export_visits():
+    return visit_controller.export_visits()
+
+
 @visit_bp.route("/upsert", methods=["POST"])
 @jwt_required()
 def upsert_visit():
@@ -20,4 +26,15 @@ def upsert_visit():
 @visit_bp.route("/bulk-upsert", methods=["POST"])
 @jwt_required()
 def bulk_upsert_visits():
-    return visit_controller.bulk_upsert_visits()
\ No newline at end of file
+    return visit_controller.bulk_upsert_visits()
+
+@visit_bp.route("/matrix/range", methods=["GET"])
+@jwt_required()
+def get_range_matrix():
+    return visit_controller.get_visit_range_matrix()
+
+
+@visit_bp.route("/copy-week", methods=["POST"])
+@jwt_required()
+def copy_week():
+    return visit_controller.copy_week()
@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache for per-process memoization.
+    Entries expire after `ttl` seconds (None = never), oldest keys are evicted
+    once `maxsize` is reached.
+    """
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=_MISSING):
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory, ttl=_MISSING):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MemoryVersions:
+    """Version counters local to this process."""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, names):
+        return [self._versions.get(name, 0) for name in names]
+
+    def bump(self, name):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return self._versions[name]
+
+
+class RedisVersions:
+    """Version counters shared by every worker through Redis."""
+
+    def __init__(self, url, prefix="suivicom:version:"):
+        import redis  # Optional dependency, only needed for this backend
+
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get_many(self, names):
+        values = self._client.mget([self._prefix + name for name in names])
+        return [int(v) if v is not None else 0 for v in values]
+
+    def bump(self, name):
+        return self._client.incr(self._prefix + name)
+
+
+class VersionRegistry:
+    """
+    Named version stamps used to invalidate in-process caches. A cached value
+    stores the stamp it was built under and is discarded once a write path
+    bumps that name. With the Redis backend, a bump in one worker invalidates
+    the caches of all workers.
+    """
+
+    def __init__(self):
+        self.backend = MemoryVersions()
+
+    def init_app(self, app):
+        if app.config.get("CACHE_BACKEND", "memory") == "redis":
+            self.backend = RedisVersions(app.config["CACHE_REDIS_URL"])
+        else:
+            self.backend = MemoryVersions()
+
+    def get(self, *names):
+        """Tuple of the current stamps, or None if the backend is unreachable."""
+        try:
+            return tuple(self.backend.get_many(names))
+        except Exception as e:
+            logger.error(f"Version lookup error: {e}")
+            return None
+
+    def bump(self, *names):
+        for name in names:
+            try:
+                self.backend.bump(name)
+            except Exception as e:
+                logger.error(f"Version bump error: {e}")
+
+
+versions = VersionRegistry()
+
+# key -> (version stamp, value)
+_versioned_values = TTLCache(maxsize=512)
+
+
+def versioned(key, names, build, ttl=None):
+    """
+    Value cached under `key` until one of the version `names` is bumped (or
+    `ttl` seconds have passed). `build()` runs on a miss; nothing is cached
+    if the versions are unavailable.
+    """
+    stamp = versions.get(*names)
+    cached = _versioned_values.get(key)
+    if cached is not None and stamp is not None and cached[0] == stamp:
+        return cached[1]
+
+    value = build()
+    if stamp is not None:
+        _versioned_values.set(key, (stamp, value), ttl=ttl)
+    return value
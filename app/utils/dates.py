@@ -0,0 +1,14 @@
+from datetime import timedelta
+
+WORK_WEEK_DAYS = 6  # Saturday -> Thursday
+
+
+def week_start(day):
+    """Saturday opening the work week that contains `day`."""
+    return day - timedelta(days=(day.weekday() - 5) % 7)
+
+
+def week_dates(day):
+    """The six working days (Saturday to Thursday) of the week containing `day`."""
+    start = week_start(day)
+    return [start + timedelta(days=i) for i in range(WORK_WEEK_DAYS)]
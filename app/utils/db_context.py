@@ -0,0 +1,66 @@
+import logging
+from flask import has_request_context
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Key in the pool's per-DBAPI-connection info dict
+_INFO_KEY = "session_user_id"
+
+
+def init_session_context(app):
+    """
+    Sets the MSSQL session context (`user_id`, used for RLS and auditing)
+    when a pooled connection is checked out, instead of on every request.
+    Requests that never touch the database cost nothing, and the EXEC is
+    skipped when the connection already carries the same user.
+    """
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "mssql":
+        return
+
+    @event.listens_for(engine, "checkout")
+    def apply_user_context(dbapi_connection, connection_record, connection_proxy):
+        _set_session_user(dbapi_connection, connection_record, _current_user_id())
+
+
+def pin_session_user(engine, user_id):
+    """
+    Same session context for an engine outside Flask (e.g. a report
+    process), where every connection acts as the fixed `user_id`.
+    """
+    if engine.dialect.name != "mssql":
+        return
+
+    @event.listens_for(engine, "checkout")
+    def apply_pinned_context(dbapi_connection, connection_record, connection_proxy):
+        _set_session_user(dbapi_connection, connection_record, user_id)
+
+
+def _set_session_user(dbapi_connection, connection_record, uid):
+    uid = str(uid) if uid is not None else None
+    if connection_record.info.get(_INFO_KEY) == uid:
+        return
+
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("EXEC sp_set_session_context @key=N'user_id', @value=?", (uid,))
+        connection_record.info[_INFO_KEY] = uid
+    except Exception as e:
+        logger.error(f"Context error: {e}")
+    finally:
+        cursor.close()
+
+
+def _current_user_id():
+    """Identity of the JWT already verified for this request, if any."""
+    if not has_request_context():
+        return None
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        # Public route: @jwt_required() never ran, do not decode the token here
+        return None
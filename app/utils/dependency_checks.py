@@ -0,0 +1,29 @@
+from sqlalchemy import exists, literal, or_, select
+from app.extensions import db
+
+# Names quoted in "cannot delete" messages
+NAME_SAMPLE_SIZE = 5
+
+
+def has_dependents(*criteria):
+    """
+    True if any `criteria` (e.g. Sale.vendor_id == 3) matches a row. All the
+    probes run as EXISTS in a single round trip, no row is loaded.
+    """
+    probes = [exists().where(criterion) for criterion in criteria]
+    return (
+        db.session.execute(select(literal(1)).where(or_(*probes))).first() is not None
+    )
+
+
+def dependent_names(query, limit=NAME_SAMPLE_SIZE):
+    """
+    "a, b, c" from the first `limit` values of a one-column query, with "…"
+    when there are more (TOP limit+1 probe), or None when it has no rows.
+    """
+    names = [str(row[0]) for row in query.limit(limit + 1).all()]
+    if not names:
+        return None
+    if len(names) > limit:
+        names[limit:] = ["…"]
+    return ", ".join(names)
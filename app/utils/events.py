@@ -0,0 +1,127 @@
+import json
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """Fans events out to the subscribers living in this process."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Slow client: drop its backlog and ask it to refetch everything
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait({"type": "resync"})
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+
+class RedisBackend:
+    """
+    Redis pub/sub relay for multi-worker deployments: events published by any
+    worker are re-dispatched to the local subscribers of every worker.
+    """
+
+    def __init__(self, url, channel="suivicom:events", queue_size=100):
+        import redis  # Optional dependency, only needed for this backend
+
+        self._client = redis.Redis.from_url(url)
+        self._channel = channel
+        self._local = MemoryBackend(queue_size)
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        self._client.publish(self._channel, json.dumps(event))
+
+    def subscribe(self):
+        self._ensure_listener()
+        return self._local.subscribe()
+
+    def unsubscribe(self, q):
+        self._local.unsubscribe(q)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                for message in pubsub.listen():
+                    self._local.publish(json.loads(message["data"]))
+            except Exception as e:
+                logger.error(f"Event relay error: {e}")
+                time.sleep(1)
+
+
+class EventBroker:
+    """
+    In-process publish/subscribe hub for "something changed" notifications.
+    Controllers publish after a successful commit, the SSE endpoint relays the
+    events to connected clients so they only refetch what actually changed.
+    """
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+
+    def init_app(self, app):
+        kind = app.config.get("EVENTS_BACKEND", "memory")
+        queue_size = app.config.get("EVENTS_QUEUE_SIZE", 100)
+        if kind == "redis":
+            self.backend = RedisBackend(
+                app.config["EVENTS_REDIS_URL"], queue_size=queue_size
+            )
+        else:
+            self.backend = MemoryBackend(queue_size)
+
+    def publish(self, kind, distributor_id, **data):
+        event = {
+            "type": kind,
+            "distributor_id": int(distributor_id) if distributor_id else None,
+            "ts": time.time(),
+            **data,
+        }
+        try:
+            self.backend.publish(event)
+        except Exception as e:
+            # Notifications are best-effort, the write itself already succeeded
+            logger.error(f"Event publish error: {e}")
+
+    @contextmanager
+    def subscribe(self):
+        q = self.backend.subscribe()
+        try:
+            yield q
+        finally:
+            self.backend.unsubscribe(q)
+
+
+broker = EventBroker()
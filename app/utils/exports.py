@@ -0,0 +1,107 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import date
+from flask import current_app, jsonify, request, stream_with_context
+
+EXPORT_FORMATS = ("csv", "xlsx")
+
+# Leading characters that make Excel read a text cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+MIMETYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def export_response(query, name, columns, batch_size=1000):
+    """
+    Streams every row of `query` as a CSV or XLSX download (`format` arg,
+    CSV by default). `columns` is a list of (header, row -> value). Rows are
+    fetched `batch_size` at a time from a server-side cursor (yield_per), so
+    the file is never held in memory. CSV is sent as the rows are read; an
+    XLSX workbook is only complete once every row is in, so its first byte
+    (and the worker's release) waits for the whole build.
+
+    Text cells that start like a formula are prefixed with "'" so that
+    spreadsheet apps show them instead of evaluating them.
+    """
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"message": "Format d'export invalide (csv ou xlsx)"}), 400
+
+    if fmt == "xlsx":
+        try:
+            chunks = _xlsx_chunks(query, columns, batch_size)
+        except ImportError:
+            return jsonify({"message": "Export XLSX indisponible sur ce serveur"}), 501
+    else:
+        chunks = _csv_chunks(query, columns, batch_size)
+
+    response = current_app.response_class(
+        stream_with_context(chunks), mimetype=MIMETYPES[fmt]
+    )
+    filename = f"{name}_{date.today():%Y%m%d}.{fmt}"
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _csv_chunks(query, columns, batch_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM so Excel opens the UTF-8 file with its accents intact
+    buffer.write("\ufeff")
+    writer.writerow([header for header, _ in columns])
+
+    for i, row in enumerate(query.yield_per(batch_size), start=1):
+        writer.writerow([_cell(get(row)) for _, get in columns])
+        if i % batch_size == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def _drain(buffer):
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return chunk
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, date) else _text(value)
+
+
+def _text(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _xlsx_chunks(query, columns, batch_size):
+    # Imported on use: only XLSX exports need it (501 if it is missing)
+    from openpyxl import Workbook
+
+    def generate():
+        # A write-only workbook spools rows to disk as they are appended; the
+        # finished file is then streamed back from a temporary file. Nothing
+        # is sent before the last row: the zip is written on save.
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append([header for header, _ in columns])
+        for row in query.yield_per(batch_size):
+            sheet.append([_text(get(row)) for _, get in columns])
+
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
+            path = tmp.name
+        try:
+            workbook.save(path)
+            with open(path, "rb") as f:
+                while chunk := f.read(64 * 1024):
+                    yield chunk
+        finally:
+            os.remove(path)
+
+    return generate()
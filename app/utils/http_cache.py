@@ -0,0 +1,33 @@
+import hashlib
+from flask import current_app, request
+from app.utils.cache import versioned
+
+
+def versioned_body(key, names, build):
+    """
+    (JSON body, etag) for `key`, cached until one of the version `names` is
+    bumped. The ETag is a hash of the body, so it is stable across workers
+    and restarts.
+    """
+
+    def serialize():
+        body = current_app.json.dumps(build(), separators=(",", ":"))
+        return body, content_hash(body)
+
+    return versioned(key, names, serialize)
+
+
+def content_hash(body):
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]
+
+
+def etag_response(body, etag):
+    """200 with a strong ETag, or an empty 304 if the client already has it."""
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    # Let clients keep the body but revalidate on every use
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
@@ -1,13 +1,240 @@
-from flask import request
+import base64
+import hashlib
+import json
+import math
+from itertools import groupby
+from datetime import date, datetime
+from flask import (
+    request,
+    abort,
+    current_app,
+    jsonify,
+    make_response,
+    stream_with_context,
+)
+from sqlalchemy import and_, or_, func
+from app.utils.cache import TTLCache
 
+# Totals of the "cached" count strategy, keyed by a hash of the filtered SQL
+_count_cache = TTLCache(maxsize=1024)
 
-def paginate(query):
-    page = request.args.get("page", 1, type=int)
+COUNT_STRATEGIES = ("exact", "window", "has_more", "cached")
+
+
+def paginate(query, keyset=None, descending=False, count="exact"):
+    """
+    Page of `query` from the request args.
+
+    Default mode: `page` / `pageSize` with OFFSET/FETCH. `count` picks how
+    the total is obtained:
+      - "exact": separate COUNT(*) query (query.paginate)
+      - "window": COUNT(*) OVER () on the page query, one round trip
+      - "has_more": fetches pageSize + 1 rows, no total (None)
+      - "cached": separate COUNT(*), memoized per filtered statement for
+        PAGINATION_COUNT_CACHE_TTL seconds
+    With "window", rows of multi-column queries carry an extra
+    `pagination_total` column.
+
+    Cursor mode (opt-in, when the request has a `cursor` arg and `keyset`
+    columns are given): seeks past the last row of the previous page instead
+    of skipping rows, so deep pages cost the same as the first one. Pass
+    `cursor=` (empty) for the first page, then the returned `next_cursor`.
+    `keyset` must end with a unique column (e.g. the primary key); the
+    query is ordered by it, ascending or `descending`. No total is computed.
+    """
+    # Endpoints that can stream check wants_stream() first and hand oversized
+    # requests to stream_rows(); the others refuse them rather than truncate
     page_size = request.args.get("pageSize", 20, type=int)
-    pagination = query.paginate(page=page, per_page=page_size)
+    if page_size > max_page_size():
+        message = f"pageSize trop grand (max {max_page_size()})"
+        abort(make_response(jsonify({"message": message}), 400))
+
+    if keyset and "cursor" in request.args:
+        return _paginate_cursor(
+            query, keyset, descending, request.args["cursor"], page_size
+        )
+
+    page = request.args.get("page", 1, type=int)
+    if count == "exact":
+        pagination = query.paginate(page=page, per_page=page_size)
+        return {
+            "items": pagination.items,
+            "total": pagination.total,
+            "page": page,
+            "pages": pagination.pages,
+            "has_more": pagination.has_next,
+            "next_cursor": None,
+        }
+    if count not in COUNT_STRATEGIES:
+        raise ValueError(f"Unknown count strategy: {count}")
+
+    page, page_size = max(1, page), max(1, page_size)
+    offset = (page - 1) * page_size
+    total = None
+
+    if count == "window":
+        rows = (
+            query.add_columns(func.count().over().label("pagination_total"))
+            .offset(offset)
+            .limit(page_size)
+            .all()
+        )
+        if rows:
+            total = rows[0].pagination_total
+        else:
+            # Past the last page the window has no row to carry the total
+            total = query.order_by(None).count() if page > 1 else 0
+        items = [r[0] for r in rows] if _single_entity(query) else rows
+    elif count == "has_more":
+        rows = query.offset(offset).limit(page_size + 1).all()
+        items = rows[:page_size]
+        has_more = len(rows) > page_size
+    else:
+        items = query.offset(offset).limit(page_size).all()
+        total = _count_cache.get_or_set(
+            _count_key(query),
+            lambda: query.order_by(None).count(),
+            ttl=current_app.config.get("PAGINATION_COUNT_CACHE_TTL", 30),
+        )
+
+    if total is not None:
+        has_more = offset + len(items) < total
     return {
-        "items": pagination.items,
-        "total": pagination.total,
+        "items": items,
+        "total": total,
         "page": page,
-        "pages": pagination.pages,
+        "pages": math.ceil(total / page_size) if total is not None else None,
+        "has_more": has_more,
+        "next_cursor": None,
     }
+
+
+def max_page_size():
+    return current_app.config.get("PAGINATION_MAX_PAGE_SIZE", 500)
+
+
+def wants_stream():
+    """True for `format=ndjson` or a `pageSize` above PAGINATION_MAX_PAGE_SIZE."""
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.args.get("pageSize", 0, type=int) > max_page_size()
+
+
+def stream_rows(query, serialize, batch_size=500, group_by=None, extra=None):
+    """
+    Streams every row of `query` instead of a page: fetched `batch_size` at
+    a time (yield_per) and serialized one by one, so memory stays flat
+    whatever the row count. Emits NDJSON for `format=ndjson`, otherwise the
+    usual `{"data": [...], "total": n}` shape, plus the `extra` keys.
+
+    The rows must come from a single statement: while they stream, the
+    connection cannot run another query (no lazy loads, no selectinload).
+    One-to-many data is joined in and `group_by(row)` gives the item key:
+    consecutive rows with the same key are serialized together, as a list
+    (the query must be ordered by that key).
+    """
+    dumps = current_app.json.dumps
+
+    def items():
+        rows = query.yield_per(batch_size)
+        if group_by is None:
+            return (serialize(row) for row in rows)
+        return (serialize(list(group)) for _, group in groupby(rows, key=group_by))
+
+    if request.args.get("format") == "ndjson":
+
+        def generate():
+            for item in items():
+                yield dumps(item) + "\n"
+
+        mimetype = "application/x-ndjson"
+    else:
+
+        def generate():
+            total = 0
+            yield '{"data":['
+            for item in items():
+                yield ("," if total else "") + dumps(item)
+                total += 1
+            yield "]," + dumps({"total": total, **(extra or {})})[1:]
+
+        mimetype = "application/json"
+
+    return current_app.response_class(
+        stream_with_context(generate()), mimetype=mimetype
+    )
+
+
+def _single_entity(query):
+    """True for Model.query-style queries (rows are entities, not tuples)."""
+    descriptions = query.column_descriptions
+    return len(descriptions) == 1 and descriptions[0]["expr"] is descriptions[0]["type"]
+
+
+def _count_key(query):
+    """Hash of the filtered statement and its parameters (ordering ignored)."""
+    compiled = query.order_by(None).statement.compile()
+    params = sorted((k, repr(v)) for k, v in compiled.params.items())
+    return hashlib.sha256(f"{compiled}|{params}".encode("utf-8")).hexdigest()
+
+
+def _paginate_cursor(query, keyset, descending, cursor, page_size):
+    page_size = max(1, page_size)
+    order = [c.desc() if descending else c.asc() for c in keyset]
+    query = query.order_by(None).order_by(*order)
+
+    if cursor:
+        try:
+            values = _decode_cursor(cursor, keyset)
+        except (ValueError, TypeError):
+            abort(400, description="Curseur invalide")
+        query = query.filter(_seek(keyset, values, descending))
+
+    # One extra row tells whether there is a next page
+    rows = query.limit(page_size + 1).all()
+    items = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = _encode_cursor([getattr(last, c.key) for c in keyset])
+
+    return {
+        "items": items,
+        "total": None,
+        "page": None,
+        "pages": None,
+        "has_more": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
+
+
+def _seek(keyset, values, descending):
+    """(k1 < v1) OR (k1 = v1 AND k2 < v2) OR ... (> when ascending)."""
+    clauses = []
+    for i, column in enumerate(keyset):
+        past = column < values[i] if descending else column > values[i]
+        equal = [keyset[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, past))
+    return or_(*clauses)
+
+
+def _encode_cursor(values):
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor, keyset):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    if not isinstance(values, list) or len(values) != len(keyset):
+        raise ValueError("cursor does not match the keyset")
+
+    decoded = []
+    for column, value in zip(keyset, values):
+        python_type = column.type.python_type
+        if python_type in (date, datetime):
+            value = python_type.fromisoformat(value)
+        decoded.append(value)
+    return decoded
@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from app.extensions import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password operations already queued, the caller should retry."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a bounded thread pool so a burst of logins cannot pin every
+    request thread (bcrypt releases the GIL while hashing). A semaphore caps
+    running + queued work: once it is exhausted, callers get
+    PasswordHasherBusy right away instead of waiting behind a growing backlog.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.timeout = None
+        self._executor = None
+        self._slots = None
+
+    def init_app(self, app):
+        workers = app.config.get("PASSWORD_HASH_WORKERS", 4)
+        pending = app.config.get("PASSWORD_HASH_MAX_PENDING", 32)
+        self.rounds = app.config.get("BCRYPT_LOG_ROUNDS", 12)
+        self.timeout = app.config.get("PASSWORD_HASH_TIMEOUT", 10)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self._slots = threading.BoundedSemaphore(workers + pending)
+
+    def check(self, pw_hash, password):
+        return self._run(bcrypt.check_password_hash, pw_hash, password)
+
+    def hash(self, password):
+        pw_hash = self._run(bcrypt.generate_password_hash, password, self.rounds)
+        return pw_hash.decode("utf-8")
+
+    def needs_rehash(self, pw_hash):
+        """True when `pw_hash` was made with a cost other than BCRYPT_LOG_ROUNDS."""
+        try:
+            return int(pw_hash.split("$")[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy()
+
+
+passwords = PasswordHasher()
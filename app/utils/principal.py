@@ -0,0 +1,120 @@
+from flask import g, abort, current_app
+from flask_jwt_extended import get_jwt_identity
+from app.extensions import db
+from app.models import User, Distributor
+from app.models.user import distributor_supervisors
+from app.utils.cache import TTLCache, versions
+
+# Roles that see every distributor (mirrors User.has_distributor)
+GLOBAL_ROLES = ("admin", "dg", "dc")
+
+# user_id -> (version stamp, Principal), shared by every request of the process
+_scope_cache = TTLCache(maxsize=10000)
+
+
+class Principal:
+    """
+    Authorization view of the current user: role + the set of distributor
+    IDs assigned through `distributor_supervisors`. Resolved once per request.
+    """
+
+    __slots__ = ("id", "role", "distributor_ids", "active_distributor_ids")
+
+    def __init__(self, id, role, distributor_ids=(), active_distributor_ids=()):
+        self.id = id
+        self.role = role
+        self.distributor_ids = frozenset(distributor_ids)
+        self.active_distributor_ids = frozenset(active_distributor_ids)
+
+    def has_distributor(self, dist_id):
+        if self.role in GLOBAL_ROLES:
+            return True
+        try:
+            return int(dist_id) in self.distributor_ids
+        except (TypeError, ValueError):
+            return False
+
+    @property
+    def default_distributor_id(self):
+        return min(self.distributor_ids) if self.distributor_ids else None
+
+
+def load_principal(user_id):
+    """
+    Cached Principal for `user_id` (None if no such user). Entries are stamped
+    with the global and per-user "scope" versions, which the admin write
+    paths bump through invalidate_scope(), so steady-state lookups cost no
+    database query.
+    """
+    user_id = int(user_id)
+    stamp = versions.get("scope", f"scope:{user_id}")
+
+    cached = _scope_cache.get(user_id)
+    if cached is not None and stamp is not None and cached[0] == stamp:
+        return cached[1]
+
+    principal = _query_principal(user_id)
+    if principal is not None and stamp is not None:
+        _scope_cache.set(
+            user_id,
+            (stamp, principal),
+            ttl=current_app.config.get("SCOPE_CACHE_TTL"),
+        )
+    return principal
+
+
+def invalidate_scope(*user_ids):
+    """
+    Drops cached scopes after role or distributor assignment changes.
+    Without IDs every user's scope is invalidated.
+    """
+    if user_ids:
+        versions.bump(*(f"scope:{int(uid)}" for uid in user_ids if uid))
+    else:
+        versions.bump("scope")
+
+
+def _query_principal(user_id):
+    """Role and assigned distributors in one ID-only query (None if no user)."""
+    rows = (
+        db.session.query(
+            User.role, distributor_supervisors.c.distributor_id, Distributor.active
+        )
+        .outerjoin(
+            distributor_supervisors, distributor_supervisors.c.user_id == User.id
+        )
+        .outerjoin(
+            Distributor, Distributor.id == distributor_supervisors.c.distributor_id
+        )
+        .filter(User.id == user_id)
+        .all()
+    )
+    if not rows:
+        return None
+
+    return Principal(
+        user_id,
+        rows[0].role,
+        (r.distributor_id for r in rows if r.distributor_id is not None),
+        (r.distributor_id for r in rows if r.distributor_id is not None and r.active),
+    )
+
+
+def get_principal(required=True):
+    """
+    The request's Principal, loaded on first use and kept on `flask.g`.
+    Aborts with 404 when the token's user no longer exists, unless
+    `required` is False (then returns None).
+    """
+    # `g` lives as long as the app context, which may outlast the request:
+    # only reuse a principal loaded for this token's user
+    user_id = int(get_jwt_identity())
+    principal = g.get("principal")
+    if principal is None or principal.id != user_id:
+        principal = load_principal(user_id)
+        if principal is None:
+            if required:
+                abort(404)
+            return None
+        g.principal = principal
+    return principal
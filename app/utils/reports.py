@@ -0,0 +1,592 @@
+import csv
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from decimal import Decimal
+from importlib.util import find_spec
+from sqlalchemy import case, create_engine, extract, func, select
+from app.models import Distributor, Product, Sale, SaleItem, Vendor, Visit, Wilaya
+from app.utils.db_context import pin_session_user
+
+logger = logging.getLogger(__name__)
+
+REPORT_FORMATS = ("csv", "parquet")
+
+# Job states, as stored in the job's metadata file
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class ReportError(Exception):
+    """Invalid report request (unknown report, bad parameters or format)."""
+
+
+# --- DEFINITIONS ---
+
+
+class ReportDefinition:
+    """
+    A parameterized report. `validate(params)` checks the request params and
+    returns them normalized (they are part of the job key). `build(conn,
+    params)` returns the statements to run, one per part (e.g. per month);
+    their rows are appended in order and progress is reported as parts done
+    / parts total. `columns` is a list of (header, type) with type in "str",
+    "int", "float", "date".
+    """
+
+    def __init__(self, name, title, columns, build, validate):
+        self.name = name
+        self.title = title
+        self.columns = columns
+        self.build = build
+        self.validate = validate
+
+
+def _period_params(params):
+    """start_date / end_date (ISO dates) + distributor_ids (None = all)."""
+    try:
+        start = date.fromisoformat(params["start_date"])
+        end = date.fromisoformat(params["end_date"])
+    except (KeyError, TypeError, ValueError):
+        raise ReportError("Paramètres start_date et end_date (AAAA-MM-JJ) requis")
+    if end < start:
+        raise ReportError("La date de fin précède la date de début")
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "distributor_ids": params.get("distributor_ids"),
+    }
+
+
+def _date_range(params):
+    return (
+        date.fromisoformat(params["start_date"]),
+        date.fromisoformat(params["end_date"]),
+    )
+
+
+def _months(start, end):
+    """(first day, last day) of each month between `start` and `end`, clipped."""
+    months = []
+    first = start
+    while first <= end:
+        if first.month == 12:
+            following = date(first.year + 1, 1, 1)
+        else:
+            following = date(first.year, first.month + 1, 1)
+        months.append((first, min(end, date.fromordinal(following.toordinal() - 1))))
+        first = following
+    return months
+
+
+def _sales_by_product_wilaya_month(conn, params):
+    start, end = _date_range(params)
+    price = case(
+        (Vendor.vendor_type == "gros", Product.price_wholesale),
+        (Vendor.vendor_type == "superette", Product.price_supermarket),
+        else_=Product.price_retail,
+    )
+    year, month = extract("year", Sale.date), extract("month", Sale.date)
+
+    parts = []
+    for first, last in _months(start, end):
+        statement = (
+            select(
+                year,
+                month,
+                Wilaya.name,
+                Product.code,
+                Product.name,
+                func.sum(SaleItem.quantity),
+                func.sum(SaleItem.quantity * price),
+            )
+            .select_from(SaleItem)
+            .join(Sale, Sale.id == SaleItem.sale_id)
+            .join(Vendor, Vendor.id == Sale.vendor_id)
+            .join(Product, Product.id == SaleItem.product_id)
+            .join(Distributor, Distributor.id == Sale.distributor_id)
+            .outerjoin(Wilaya, Wilaya.id == Distributor.wilaya_id)
+            .where(Sale.status == "complete", Sale.date >= first, Sale.date <= last)
+            .group_by(year, month, Wilaya.name, Product.code, Product.name)
+            .order_by(Wilaya.name, Product.name)
+        )
+        if params["distributor_ids"] is not None:
+            statement = statement.where(
+                Sale.distributor_id.in_(params["distributor_ids"])
+            )
+        parts.append(statement)
+    return parts
+
+
+def _visit_coverage_by_vendor(conn, params):
+    start, end = _date_range(params)
+    planned = func.coalesce(func.sum(Visit.planned_visits), 0)
+    actual = func.coalesce(func.sum(Visit.actual_visits), 0)
+
+    dist_ids = params["distributor_ids"]
+    if dist_ids is None:
+        dist_ids = conn.execute(select(Distributor.id).order_by(Distributor.id))
+        dist_ids = [row[0] for row in dist_ids]
+
+    # One part per distributor: a vendor's rows never span two parts
+    return [
+        select(
+            Distributor.name,
+            Vendor.code,
+            func.concat(Vendor.first_name, " ", Vendor.last_name),
+            Vendor.vendor_type,
+            planned,
+            actual,
+            func.coalesce(func.sum(Visit.invoice_count), 0),
+            func.round(actual * 100.0 / func.nullif(planned, 0), 1),
+        )
+        .select_from(Vendor)
+        .join(Distributor, Distributor.id == Vendor.distributor_id)
+        .outerjoin(
+            Visit,
+            (Visit.vendor_id == Vendor.id)
+            & (Visit.date >= start)
+            & (Visit.date <= end),
+        )
+        .where(Vendor.distributor_id == dist_id)
+        .group_by(
+            Distributor.name,
+            Vendor.id,
+            Vendor.code,
+            Vendor.first_name,
+            Vendor.last_name,
+            Vendor.vendor_type,
+        )
+        .order_by(Vendor.last_name, Vendor.id)
+        for dist_id in sorted(dist_ids)
+    ]
+
+
+REPORTS = {
+    d.name: d
+    for d in [
+        ReportDefinition(
+            "sales_by_product_wilaya_month",
+            "Ventes (livrées) par produit, wilaya et mois",
+            [
+                ("Année", "int"),
+                ("Mois", "int"),
+                ("Wilaya", "str"),
+                ("Code produit", "str"),
+                ("Produit", "str"),
+                ("Quantité", "int"),
+                ("Montant", "float"),
+            ],
+            _sales_by_product_wilaya_month,
+            _period_params,
+        ),
+        ReportDefinition(
+            "visit_coverage_by_vendor",
+            "Couverture des visites par vendeur",
+            [
+                ("Distributeur", "str"),
+                ("Code vendeur", "str"),
+                ("Vendeur", "str"),
+                ("Type vendeur", "str"),
+                ("Visites prévues", "int"),
+                ("Visites effectuées", "int"),
+                ("Factures", "int"),
+                ("Couverture (%)", "float"),
+            ],
+            _visit_coverage_by_vendor,
+            _period_params,
+        ),
+    ]
+}
+
+
+# --- FILE STORE ---
+
+
+class ReportStore:
+    """
+    Report files under one directory: `<job id>.json` holds the job status,
+    `<job id>.<format>` the finished output. Metadata is replaced atomically,
+    so any web worker (or the report process) can read or update it.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def meta_path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def output_path(self, job_id, fmt):
+        return os.path.join(self.root, f"{job_id}.{fmt}")
+
+    def read(self, job_id):
+        # Job ids come from URLs, only ever map them to files of this store
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self.meta_path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write(self, job_id, meta):
+        meta["updated_at"] = time.time()
+        tmp = f"{self.meta_path(job_id)}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path(job_id))
+        return meta
+
+    def update(self, job_id, **fields):
+        meta = self.read(job_id) or {"id": job_id}
+        meta.update(fields)
+        return self.write(job_id, meta)
+
+    def cleanup(self, max_age):
+        """Deletes jobs (metadata and output) last touched over `max_age` seconds ago."""
+        cutoff = time.time() - max_age
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+# --- RUNNER ---
+
+
+class ReportRunner:
+    """
+    Runs report definitions in a process pool (heavy aggregations stay off
+    the request workers) and writes their output to a ReportStore. Jobs are
+    keyed by a hash of (report, params, format): an identical request gets
+    the existing job while it is queued or running, and its file for
+    REPORT_REUSE_SECONDS once done.
+
+    Report connections act as REPORT_SERVICE_USER_ID in the MSSQL session
+    context (RLS, auditing): a job is shared by every user asking for the
+    same scope, so it has no requesting user. Scoping is the job's
+    `distributor_ids`, checked against the caller on submit, status and
+    download.
+    """
+
+    def __init__(self):
+        self.store = None
+        self.database_uri = None
+        self.service_user_id = None
+        self.workers = 2
+        self.reuse_seconds = 3600
+        self.retention_seconds = 24 * 3600
+        self.stall_seconds = 300
+        self.heartbeat_seconds = 30
+        self.batch_size = 5000
+        self._executor = None
+        # job id -> future of the runs submitted by this process, shared by
+        # request threads and done callbacks
+        self._futures = {}
+        self._futures_lock = threading.Lock()
+
+    def init_app(self, app):
+        root = app.config.get("REPORT_DIR") or os.path.join(
+            app.instance_path, "reports"
+        )
+        os.makedirs(root, exist_ok=True)
+        self.store = ReportStore(root)
+        self.database_uri = app.config["SQLALCHEMY_DATABASE_URI"]
+        self.service_user_id = app.config.get("REPORT_SERVICE_USER_ID")
+        self.workers = app.config.get("REPORT_WORKERS", 2)
+        self.reuse_seconds = app.config.get("REPORT_REUSE_SECONDS", 3600)
+        self.retention_seconds = app.config.get("REPORT_RETENTION_HOURS", 24) * 3600
+        self.stall_seconds = app.config.get("REPORT_STALL_SECONDS", 300)
+        self.heartbeat_seconds = app.config.get("REPORT_HEARTBEAT_SECONDS", 30)
+        self.batch_size = app.config.get("REPORT_BATCH_SIZE", 5000)
+
+        if self.service_user_id is None and self.database_uri.startswith("mssql"):
+            logger.warning(
+                "REPORT_SERVICE_USER_ID is not set: report queries run without "
+                "a session user_id"
+            )
+
+    def submit(self, name, params, fmt, user_id):
+        """Job metadata for the request, reused when an identical one is live."""
+        if name not in REPORTS:
+            raise ReportError(f"Rapport inconnu : {name}")
+        params = REPORTS[name].validate(params)
+        if fmt not in REPORT_FORMATS:
+            raise ReportError("Format invalide (csv ou parquet)")
+        if fmt == "parquet" and find_spec("pyarrow") is None:
+            raise ReportError("Format parquet indisponible sur ce serveur")
+
+        self.store.cleanup(self.retention_seconds)
+
+        job_id = job_key(name, params, fmt)
+        meta = self.store.read(job_id)
+        if meta is not None and self._reusable(meta):
+            return meta
+
+        # A new run id: a superseded run notices it and stops writing
+        run_id = uuid.uuid4().hex
+        meta = self.store.write(
+            job_id,
+            {
+                "id": job_id,
+                "run_id": run_id,
+                "report": name,
+                "params": params,
+                "format": fmt,
+                "requested_by": user_id,
+                "owner_pid": os.getpid(),
+                "status": QUEUED,
+                "progress": 0,
+                "rows": 0,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "heartbeat_at": None,
+            },
+        )
+        kwargs = {
+            "root": self.store.root,
+            "job_id": job_id,
+            "run_id": run_id,
+            "database_uri": self.database_uri,
+            "service_user_id": self.service_user_id,
+            "batch_size": self.batch_size,
+            "heartbeat_seconds": self.heartbeat_seconds,
+        }
+        try:
+            future = self._pool().submit(run_report, **kwargs)
+        except BrokenProcessPool:
+            # A report process died and took the pool with it, start a new one
+            self._executor = None
+            future = self._pool().submit(run_report, **kwargs)
+        with self._futures_lock:
+            self._futures[job_id] = future
+        # Outside the lock: the callback runs right away if the run is over
+        future.add_done_callback(lambda f: self._on_done(job_id, run_id, f))
+        return meta
+
+    def status(self, job_id):
+        return self.store.read(job_id)
+
+    def output_path(self, meta):
+        return self.store.output_path(meta["id"], meta["format"])
+
+    def _reusable(self, meta):
+        now = time.time()
+        if meta["status"] == DONE:
+            return now - meta["created_at"] < self.reuse_seconds
+        if meta["status"] == RUNNING:
+            # The report process heartbeats on a timer, even while SQL Server
+            # is still aggregating: only a dead process goes quiet
+            return now - meta["heartbeat_at"] < self.stall_seconds
+        if meta["status"] == QUEUED:
+            # Waiting for a free report process, for as long as its pool lives
+            if meta["owner_pid"] == os.getpid():
+                with self._futures_lock:
+                    future = self._futures.get(meta["id"])
+                return future is not None and not future.done()
+            return _process_alive(meta["owner_pid"])
+        return False
+
+    def _on_done(self, job_id, run_id, future):
+        with self._futures_lock:
+            if self._futures.get(job_id) is future:
+                del self._futures[job_id]
+        # run_report records its own failures, this only sees a dead process
+        if future.exception() is not None:
+            logger.error("Report process crashed", exc_info=future.exception())
+            _JobRecord(self.store, job_id, run_id).update(
+                status=FAILED, error="Processus interrompu"
+            )
+
+    def _pool(self):
+        # Created on first use: no idle processes in workers that never report
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+
+def job_key(name, params, fmt):
+    raw = json.dumps([name, params, fmt], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Superseded(Exception):
+    """The job was resubmitted (this run was considered stalled)."""
+
+
+class _JobRecord:
+    """
+    Metadata updates of one run. They are dropped once the job belongs to
+    another run, and serialized with the heartbeat thread of the process.
+    """
+
+    def __init__(self, store, job_id, run_id):
+        self.store = store
+        self.job_id = job_id
+        self.run_id = run_id
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            meta = self.store.read(self.job_id)
+            if meta is None or meta.get("run_id") != self.run_id:
+                return None
+            meta.update(fields)
+            return self.store.write(self.job_id, meta)
+
+    def heartbeat(self, stop, interval):
+        while not stop.wait(interval):
+            if self.update(heartbeat_at=time.time()) is None:
+                return
+
+
+def run_report(
+    root,
+    job_id,
+    run_id,
+    database_uri,
+    service_user_id,
+    batch_size,
+    heartbeat_seconds,
+):
+    """Process pool entry point: runs one job and records its outcome."""
+    record = _JobRecord(ReportStore(root), job_id, run_id)
+    now = time.time()
+    meta = record.update(status=RUNNING, started_at=now, heartbeat_at=now)
+    if meta is None:
+        return
+
+    stop = threading.Event()
+    threading.Thread(
+        target=record.heartbeat, args=(stop, heartbeat_seconds), daemon=True
+    ).start()
+
+    output = record.store.output_path(job_id, meta["format"])
+    tmp = f"{output}.{run_id}.tmp"
+    engine = create_engine(database_uri)
+    pin_session_user(engine, service_user_id)
+    try:
+        with engine.connect() as conn:
+            rows = write_report(
+                conn,
+                REPORTS[meta["report"]],
+                meta["params"],
+                meta["format"],
+                tmp,
+                batch_size,
+                lambda **fields: _record_progress(record, **fields),
+            )
+        os.replace(tmp, output)
+        record.update(status=DONE, progress=100, rows=rows)
+    except _Superseded:
+        logger.warning("Report %s: run %s superseded, stopping", job_id, run_id)
+    except Exception as e:
+        logger.exception("Report %s (%s) failed", meta["report"], job_id)
+        record.update(status=FAILED, error=str(e))
+    finally:
+        stop.set()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        engine.dispose()
+
+
+def _record_progress(record, **fields):
+    if record.update(**fields) is None:
+        raise _Superseded()
+
+
+def write_report(conn, definition, params, fmt, path, batch_size, on_progress):
+    """
+    Runs `definition` on `conn` and writes its rows to `path`, reporting
+    `on_progress(rows=..., progress=...)` after each batch and part. Returns
+    the row count.
+    """
+    parts = definition.build(conn, params)
+    writer = _WRITERS[fmt](path, definition.columns)
+    rows = 0
+    try:
+        for done, statement in enumerate(parts, start=1):
+            result = conn.execution_options(stream_results=True).execute(statement)
+            while batch := result.fetchmany(batch_size):
+                writer.write([[_cell(v) for v in row] for row in batch])
+                rows += len(batch)
+                on_progress(rows=rows)
+            on_progress(progress=round(done * 100 / len(parts)))
+    finally:
+        writer.close()
+    return rows
+
+
+def _cell(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+class _CsvWriter:
+    def __init__(self, path, columns):
+        self._file = open(path, "w", newline="", encoding="utf-8-sig")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow([header for header, _ in columns])
+
+    def write(self, rows):
+        self._csv.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path, columns):
+        # Optional dependency, only needed for this format
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {
+            "str": pa.string(),
+            "int": pa.int64(),
+            "float": pa.float64(),
+            "date": pa.date32(),
+        }
+        self._pa = pa
+        self._schema = pa.schema([(header, types[t]) for header, t in columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self._writer.write_table(
+            self._pa.Table.from_arrays(
+                [self._pa.array(c, type=f.type) for c, f in zip(columns, self._schema)],
+                schema=self._schema,
+            )
+        )
+
+    def close(self):
+        self._writer.close()
+
+
+_WRITERS = {"csv": _CsvWriter, "parquet": _ParquetWriter}
+
+
+reports = ReportRunner()
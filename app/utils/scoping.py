@@ -0,0 +1,28 @@
+from sqlalchemy import select
+from app.models import Distributor
+from app.models.user import distributor_supervisors
+
+
+def supervised_by(column, user_id, active_only=False):
+    """
+    EXISTS clause: the distributor referenced by `column` is assigned to
+    `user_id` in `distributor_supervisors`. Only the user ID is bound, so the
+    statement (and its cached plan) stays the same whatever the scope size,
+    and it never runs into the 2,100-parameter limit of a literal IN list.
+    """
+    stmt = select(distributor_supervisors.c.distributor_id).where(
+        distributor_supervisors.c.user_id == user_id,
+        distributor_supervisors.c.distributor_id == column,
+    )
+    if active_only:
+        stmt = stmt.join(
+            Distributor, Distributor.id == distributor_supervisors.c.distributor_id
+        ).where(Distributor.active.is_(True))
+    return stmt.exists()
+
+
+def scope_to_supervisor(query, column, principal, active_only=False):
+    """Restricts `query` to the principal's distributors when it is a supervisor."""
+    if principal.role == "superviseur":
+        query = query.filter(supervised_by(column, principal.id, active_only))
+    return query
@@ -0,0 +1,135 @@
+from app.extensions import db
+from sqlalchemy import text
+from app.utils.dates import WORK_WEEK_DAYS
+from datetime import timedelta
+
+
+def copy_planned_visits(
+    distributor_id, source_start, target_start, supervisor_id, overwrite=False
+):
+    """
+    Clones the planned visits of a work week onto another week in a single
+    MERGE. Existing target rows are kept unless `overwrite` is set, in which
+    case only their planned count is replaced. Returns the affected row count.
+    """
+    sql = text("""
+        MERGE dbo.visits AS target
+        USING (
+            SELECT v.vendor_id,
+                   DATEADD(day, :offset, v.date) AS target_date,
+                   MAX(v.visites_programmees) AS planned
+            FROM dbo.visits v
+            JOIN dbo.vendors vd ON vd.id = v.vendor_id
+            WHERE v.distributor_id = :d_id
+              AND v.date BETWEEN :src_start AND :src_end
+              AND v.visites_programmees > 0
+              AND vd.active = 1
+            GROUP BY v.vendor_id, v.date
+        ) AS source
+        ON (target.vendor_id = source.vendor_id AND target.date = source.target_date)
+        WHEN MATCHED AND :overwrite = 1 THEN
+            UPDATE SET visites_programmees = source.planned
+        WHEN NOT MATCHED THEN
+            INSERT (date, distributor_id, vendor_id, supervisor_id,
+                    visites_programmees, visites_effectuees, nb_factures, created_at)
+            VALUES (source.target_date, :d_id, source.vendor_id, :uid,
+                    source.planned, 0, 0, GETDATE());
+    """)
+    result = db.session.execute(
+        sql,
+        {
+            **_week_params(distributor_id, source_start, target_start),
+            "uid": supervisor_id,
+            "overwrite": 1 if overwrite else 0,
+        },
+    )
+    return result.rowcount
+
+
+def copy_sales_as_draft(distributor_id, source_start, target_start, supervisor_id):
+    """
+    Copies the sale quantities of a work week onto another week as draft
+    ('en_cours') sales, so inventory is untouched until they are completed.
+    Vendor/days that already have a sale in the target week are skipped.
+    Returns (sales_created, items_created).
+    """
+    params = {
+        **_week_params(distributor_id, source_start, target_start),
+        "uid": supervisor_id,
+    }
+
+    headers = db.session.execute(
+        text("""
+            INSERT INTO dbo.sales (date, distributor_id, vendor_id, supervisor_id,
+                                   status, montant_total, created_at)
+            SELECT DATEADD(day, :offset, src.date), :d_id, src.vendor_id, :uid,
+                   'en_cours', 0, GETDATE()
+            FROM (
+                SELECT DISTINCT s.vendor_id, s.date
+                FROM dbo.sales s
+                JOIN dbo.vendors vd ON vd.id = s.vendor_id
+                WHERE s.distributor_id = :d_id
+                  AND s.date BETWEEN :src_start AND :src_end
+                  AND vd.active = 1
+            ) AS src
+            WHERE NOT EXISTS (
+                SELECT 1 FROM dbo.sales t
+                WHERE t.vendor_id = src.vendor_id
+                  AND t.date = DATEADD(day, :offset, src.date)
+            );
+        """),
+        params,
+    ).rowcount
+
+    # Only fill drafts that are still empty, never merge into typed-in data
+    items = db.session.execute(
+        text("""
+            INSERT INTO dbo.sale_items (sale_id, product_id, quantity)
+            SELECT t.id, si.product_id, si.quantity
+            FROM dbo.sales s
+            JOIN dbo.sale_items si ON si.sale_id = s.id
+            JOIN dbo.sales t ON t.vendor_id = s.vendor_id
+                            AND t.date = DATEADD(day, :offset, s.date)
+            WHERE s.distributor_id = :d_id
+              AND s.date BETWEEN :src_start AND :src_end
+              AND si.quantity > 0
+              AND t.status = 'en_cours'
+              AND NOT EXISTS (SELECT 1 FROM dbo.sale_items x WHERE x.sale_id = t.id);
+        """),
+        params,
+    ).rowcount
+
+    # Same pricing rule as sale_controller._recalculate_total
+    db.session.execute(
+        text("""
+            UPDATE t SET montant_total = ISNULL((
+                SELECT SUM(si.quantity * CASE vd.vendor_type
+                               WHEN 'gros' THEN p.price_gros
+                               WHEN 'superette' THEN p.price_superette
+                               ELSE p.price_detail END)
+                FROM dbo.sale_items si
+                JOIN dbo.products p ON p.id = si.product_id
+                WHERE si.sale_id = t.id
+            ), 0)
+            FROM dbo.sales t
+            JOIN dbo.vendors vd ON vd.id = t.vendor_id
+            WHERE t.distributor_id = :d_id
+              AND t.date BETWEEN :tgt_start AND :tgt_end
+              AND t.status = 'en_cours';
+        """),
+        params,
+    )
+
+    return headers, items
+
+
+def _week_params(distributor_id, source_start, target_start):
+    last_day = timedelta(days=WORK_WEEK_DAYS - 1)
+    return {
+        "d_id": distributor_id,
+        "offset": (target_start - source_start).days,
+        "src_start": source_start,
+        "src_end": source_start + last_day,
+        "tgt_start": target_start,
+        "tgt_end": target_start + last_day,
+    }
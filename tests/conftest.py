@@ -64,8 +64,8 @@ def auth_headers(client, app, db):
         username=unique_username,
         password_hash=bcrypt.generate_password_hash("password123").decode("utf-8"),
         role="superviseur",
-        nom="Test",
-        prenom="Supervisor",
+        last_name="Test",
+        first_name="Supervisor",
     )
     db.session.add(user)
     db.session.flush()
@@ -91,8 +91,8 @@ def admin_auth_headers(client, app, db):
         username=unique_username,
         password_hash=bcrypt.generate_password_hash("password123").decode("utf-8"),
         role="admin",
-        nom="Admin",
-        prenom="User",
+        last_name="Admin",
+        first_name="User",
     )
     db.session.add(user)
     db.session.flush()
@@ -129,14 +129,14 @@ def test_hierarchy(db):
 
 @pytest.fixture
 def test_distributor(db, test_hierarchy, auth_headers):
-    """Create a test distributor for the test supervisor"""
+    """Create a test distributor assigned to the test supervisor"""
     dist = Distributor(
-        nom=f"Dist_{uuid.uuid4().hex[:4]}",
+        name=f"Dist_{uuid.uuid4().hex[:4]}",
         wilaya_id=test_hierarchy["wilaya"].id,
-        supervisor_id=auth_headers["user_id"],
         active=True,
     )
     db.session.add(dist)
+    auth_headers["user"].supervised_distributors.append(dist)
     db.session.flush()
     return dist
 
@@ -174,8 +174,8 @@ def test_product(db):
 def test_vendor(db, test_distributor, auth_headers):
     """Create a test vendor"""
     vend = Vendor(
-        nom=f"Vendor_{uuid.uuid4().hex[:4]}",
-        prenom="Test",
+        last_name=f"Vendor_{uuid.uuid4().hex[:4]}",
+        first_name="Test",
         code=f"VEND_{uuid.uuid4().hex[:4]}",
         vendor_type="detail",
         distributor_id=test_distributor.id,
@@ -1,5 +1,3 @@
-import pytest
-import uuid
 from datetime import datetime
 from app.models import Sale, Distributor, Wilaya, Zone, Region
 
@@ -49,3 +47,41 @@ def test_dashboard_stats_calculation(client, auth_headers, db):
     metrics = response.json["data"]["metrics"]
     # Total should be exactly 1200.0
     assert metrics["sales"] == 1200.0
+
+
+def test_dashboard_trends_series_and_comparisons(
+    client, auth_headers, db, test_distributor
+):
+    from datetime import date, timedelta
+
+    dist = test_distributor
+
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    db.session.add_all(
+        [
+            Sale(date=yesterday, distributor_id=dist.id, total_amount=50),
+            Sale(date=today, distributor_id=dist.id, total_amount=100),
+        ]
+    )
+    db.session.commit()
+
+    response = client.get(
+        f"/api/supervisor/dashboard/trends?startDate={yesterday.isoformat()}",
+        headers={"Authorization": auth_headers["Authorization"]},
+    )
+
+    assert response.status_code == 200
+    data = response.json["data"]
+    assert [p["sales"] for p in data["series"]] == [50.0, 100.0]
+    assert data["totals"]["sales"] == 150.0
+    assert data["comparisons"]["mom"]["sales"]["current"] == 150.0
+    assert "yoy" in data["comparisons"]
+
+
+def test_dashboard_trends_rejects_foreign_distributor(client, auth_headers, db):
+    response = client.get(
+        "/api/supervisor/dashboard/trends?distributor_id=999999",
+        headers={"Authorization": auth_headers["Authorization"]},
+    )
+    assert response.status_code == 403
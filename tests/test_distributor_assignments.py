@@ -0,0 +1,85 @@
+import uuid
+from app.models import Distributor, User
+from app.extensions import bcrypt
+
+
+def _supervisor(db):
+    user = User(
+        username=f"sup_{uuid.uuid4().hex[:8]}",
+        password_hash=bcrypt.generate_password_hash("password123").decode("utf-8"),
+        role="superviseur",
+    )
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def _distributors(db, wilaya, count):
+    dists = [
+        Distributor(name=f"Dist_{uuid.uuid4().hex[:6]}", wilaya_id=wilaya.id)
+        for _ in range(count)
+    ]
+    db.session.add_all(dists)
+    db.session.flush()
+    return dists
+
+
+def test_bulk_reassign_only_adds_missing_rows(
+    client, db, admin_auth_headers, test_hierarchy
+):
+    sup = _supervisor(db)
+    dists = _distributors(db, test_hierarchy["wilaya"], 3)
+    sup.supervised_distributors.append(dists[0])
+    db.session.flush()
+
+    res = client.post(
+        "/api/admin/distributors/bulk-reassign",
+        json={"supervisor_id": sup.id, "distributor_ids": [d.id for d in dists]},
+        headers=admin_auth_headers,
+    )
+
+    assert res.status_code == 200
+    assert res.json["added"] == 2
+
+
+def test_transfer_moves_all_distributors(
+    client, db, admin_auth_headers, test_hierarchy
+):
+    source, target = _supervisor(db), _supervisor(db)
+    dists = _distributors(db, test_hierarchy["wilaya"], 3)
+    source.supervised_distributors.extend(dists)
+    target.supervised_distributors.append(dists[0])
+    db.session.flush()
+
+    res = client.post(
+        "/api/admin/distributors/transfer",
+        json={"from_supervisor_id": source.id, "to_supervisor_id": target.id},
+        headers=admin_auth_headers,
+    )
+
+    assert res.status_code == 200
+    assert res.json["moved"] == 3
+    assert res.json["added"] == 2
+
+
+def test_transfer_rejects_an_empty_selection(
+    client, db, admin_auth_headers, test_hierarchy
+):
+    source, target = _supervisor(db), _supervisor(db)
+    source.supervised_distributors.extend(
+        _distributors(db, test_hierarchy["wilaya"], 2)
+    )
+    db.session.flush()
+
+    res = client.post(
+        "/api/admin/distributors/transfer",
+        json={
+            "from_supervisor_id": source.id,
+            "to_supervisor_id": target.id,
+            "distributor_ids": [],
+        },
+        headers=admin_auth_headers,
+    )
+
+    assert res.status_code == 400
+    assert len(source.supervised_distributors) == 2
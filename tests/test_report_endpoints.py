@@ -0,0 +1,137 @@
+import os
+import uuid
+import pytest
+from concurrent.futures import Future
+from flask_jwt_extended import create_access_token
+from app.models import User
+from app.utils.reports import DONE, REPORTS, ReportStore, reports, write_report
+
+
+class PendingExecutor:
+    """Accepts jobs and never runs them: they stay queued."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, **kwargs):
+        self.submitted.append(kwargs)
+        return Future()
+
+
+@pytest.fixture
+def report_store(tmp_path, monkeypatch):
+    executor = PendingExecutor()
+    monkeypatch.setattr(reports, "store", ReportStore(str(tmp_path)))
+    monkeypatch.setattr(reports, "_executor", executor)
+    monkeypatch.setattr(reports, "_futures", {})
+    return executor
+
+
+def _request(client, auth_headers):
+    return client.post(
+        "/api/supervisor/reports",
+        json={
+            "report": "sales_by_product_wilaya_month",
+            "params": {"start_date": "2024-01-01", "end_date": "2024-02-29"},
+        },
+        headers={"Authorization": auth_headers["Authorization"]},
+    )
+
+
+def test_report_request_is_queued_then_reused(
+    client, auth_headers, db, report_store, test_distributor
+):
+    first = _request(client, auth_headers)
+    second = _request(client, auth_headers)
+
+    assert first.status_code == 202
+    assert first.json["status"] == "queued"
+    assert first.json["params"]["distributor_ids"] == [test_distributor.id]
+    assert second.status_code == 202
+    assert second.json["id"] == first.json["id"]
+    assert len(report_store.submitted) == 1
+
+
+def test_report_download_waits_for_the_job(
+    client, auth_headers, db, report_store, test_distributor
+):
+    headers = {"Authorization": auth_headers["Authorization"]}
+    job_id = _request(client, auth_headers).json["id"]
+
+    response = client.get(f"/api/supervisor/reports/{job_id}/download", headers=headers)
+    assert response.status_code == 409
+
+    # What the report process does, on the test transaction's connection
+    job = reports.status(job_id)
+    rows = write_report(
+        db.session.connection(),
+        REPORTS[job["report"]],
+        job["params"],
+        job["format"],
+        reports.output_path(job),
+        1000,
+        lambda **fields: None,
+    )
+    reports.store.update(job_id, status=DONE, progress=100, rows=rows)
+
+    response = client.get(f"/api/supervisor/reports/{job_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json["status"] == "done"
+
+    response = client.get(f"/api/supervisor/reports/{job_id}/download", headers=headers)
+    assert response.status_code == 200
+    assert response.data.decode("utf-8-sig").startswith("Année,Mois,Wilaya")
+
+    # A finished job is handed back as is
+    again = _request(client, auth_headers)
+    assert again.status_code == 200
+    assert again.json["id"] == job_id
+
+    # Output deleted by the retention cleanup
+    os.remove(reports.output_path(job))
+    response = client.get(f"/api/supervisor/reports/{job_id}/download", headers=headers)
+    assert response.status_code == 410
+
+
+def test_report_of_another_scope_is_forbidden(
+    client, auth_headers, db, report_store, test_distributor
+):
+    job_id = _request(client, auth_headers).json["id"]
+
+    other_sup = User(
+        username=f"other_{uuid.uuid4().hex[:8]}",
+        password_hash="...",
+        role="superviseur",
+    )
+    db.session.add(other_sup)
+    db.session.commit()
+    token = create_access_token(
+        identity=str(other_sup.id), additional_claims={"role": "superviseur"}
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert (
+        client.get(f"/api/supervisor/reports/{job_id}", headers=headers).status_code
+        == 403
+    )
+    response = client.get(f"/api/supervisor/reports/{job_id}/download", headers=headers)
+    assert response.status_code == 403
+
+
+def test_report_request_rejects_foreign_distributor(
+    client, auth_headers, db, report_store
+):
+    response = client.post(
+        "/api/supervisor/reports",
+        json={
+            "report": "sales_by_product_wilaya_month",
+            "params": {
+                "start_date": "2024-01-01",
+                "end_date": "2024-01-31",
+                "distributor_ids": [999999],
+            },
+        },
+        headers={"Authorization": auth_headers["Authorization"]},
+    )
+    assert response.status_code == 403
+    assert report_store.submitted == []
@@ -0,0 +1,62 @@
+from unittest.mock import patch
+from app.utils.cache import TTLCache, VersionRegistry, versioned, versions
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the oldest entry
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(ttl=10)
+    with patch("app.utils.cache.time.monotonic", return_value=100.0):
+        cache.set("k", "v")
+    with patch("app.utils.cache.time.monotonic", return_value=105.0):
+        assert cache.get("k") == "v"
+    with patch("app.utils.cache.time.monotonic", return_value=111.0):
+        assert cache.get("k") is None
+
+
+def test_ttl_cache_get_or_set_calls_factory_once():
+    cache = TTLCache()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return "value"
+
+    assert cache.get_or_set("k", factory) == "value"
+    assert cache.get_or_set("k", factory) == "value"
+    assert len(calls) == 1
+
+
+def test_version_registry_bump_changes_stamp():
+    registry = VersionRegistry()
+    before = registry.get("scope", "scope:1")
+
+    registry.bump("scope:1")
+
+    assert registry.get("scope", "scope:1") != before
+    assert registry.get("scope") == before[:1]
+
+
+def test_versioned_rebuilds_only_after_bump():
+    calls = []
+
+    def build():
+        calls.append(1)
+        return len(calls)
+
+    assert versioned("test:value", ["test-section"], build) == 1
+    assert versioned("test:value", ["test-section"], build) == 1
+
+    versions.bump("test-section")
+
+    assert versioned("test:value", ["test-section"], build) == 2
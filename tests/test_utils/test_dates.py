@@ -0,0 +1,17 @@
+from datetime import date
+from app.utils.dates import week_start, week_dates
+
+
+def test_week_start_snaps_to_saturday():
+    saturday = date(2026, 2, 7)
+    assert week_start(saturday) == saturday
+    assert week_start(date(2026, 2, 8)) == saturday  # Sunday
+    assert week_start(date(2026, 2, 12)) == saturday  # Thursday
+    assert week_start(date(2026, 2, 13)) == saturday  # Friday
+
+
+def test_week_dates_cover_saturday_to_thursday():
+    days = week_dates(date(2026, 2, 10))
+    assert len(days) == 6
+    assert days[0].weekday() == 5
+    assert days[-1].weekday() == 3
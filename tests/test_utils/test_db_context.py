@@ -0,0 +1,47 @@
+from flask import Flask
+from app.utils.db_context import _current_user_id, _set_session_user
+
+
+def test_no_user_outside_requests():
+    assert _current_user_id() is None
+
+
+def test_unverified_request_does_not_decode_the_token():
+    app = Flask(__name__)
+    headers = {"Authorization": "Bearer not-a-real-token"}
+    with app.test_request_context(headers=headers):
+        assert _current_user_id() is None
+
+
+class FakeCursor:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def execute(self, sql, params):
+        self.calls.append(params)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.calls = []
+
+    def cursor(self):
+        return FakeCursor(self.calls)
+
+
+class FakeRecord:
+    def __init__(self):
+        self.info = {}
+
+
+def test_session_user_is_set_once_per_connection():
+    conn, record = FakeConnection(), FakeRecord()
+
+    _set_session_user(conn, record, 42)
+    _set_session_user(conn, record, 42)
+    _set_session_user(conn, record, None)
+
+    assert conn.calls == [("42",), (None,)]
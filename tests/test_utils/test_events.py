@@ -0,0 +1,34 @@
+from app.utils.events import EventBroker, MemoryBackend
+
+
+def test_broker_delivers_events_to_subscribers():
+    broker = EventBroker()
+
+    with broker.subscribe() as q:
+        broker.publish("sales", 12, vendor_id=3)
+        event = q.get_nowait()
+
+    assert event["type"] == "sales"
+    assert event["distributor_id"] == 12
+    assert event["vendor_id"] == 3
+
+
+def test_unsubscribed_queue_receives_nothing():
+    broker = EventBroker()
+
+    with broker.subscribe() as q:
+        pass
+    broker.publish("visits", 1)
+
+    assert q.empty()
+
+
+def test_slow_subscriber_gets_resync_instead_of_backlog():
+    backend = MemoryBackend(queue_size=2)
+    q = backend.subscribe()
+
+    for i in range(3):
+        backend.publish({"type": "inventory", "distributor_id": i})
+
+    assert q.get_nowait() == {"type": "resync"}
+    assert q.empty()
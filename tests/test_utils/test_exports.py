@@ -0,0 +1,37 @@
+import csv
+import io
+from datetime import date
+from app.utils.exports import _csv_chunks
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def yield_per(self, count):
+        return iter(self.rows)
+
+
+def test_csv_chunks_write_header_then_rows_per_batch():
+    columns = [("ID", lambda r: r[0]), ("Date", lambda r: r[1])]
+    rows = [(i, date(2024, 1, i)) for i in range(1, 6)]
+
+    chunks = list(_csv_chunks(FakeQuery(rows), columns, batch_size=2))
+    parsed = list(csv.reader(io.StringIO("".join(chunks).lstrip("\ufeff"))))
+
+    assert len(chunks) == 3
+    assert parsed[0] == ["ID", "Date"]
+    assert parsed[1] == ["1", "2024-01-01"]
+    assert len(parsed) == 6
+
+
+def test_csv_cells_starting_like_formulas_are_escaped():
+    columns = [("Nom", lambda r: r[0]), ("Montant", lambda r: r[1])]
+    rows = [('=HYPERLINK("x")', -5), ("@SUM(A1)", 1), ("Client - Alger", 2)]
+
+    chunks = list(_csv_chunks(FakeQuery(rows), columns, batch_size=10))
+    parsed = list(csv.reader(io.StringIO("".join(chunks).lstrip("\ufeff"))))
+
+    assert parsed[1] == ['\'=HYPERLINK("x")', "-5"]
+    assert parsed[2] == ["'@SUM(A1)", "1"]
+    assert parsed[3] == ["Client - Alger", "2"]
@@ -0,0 +1,30 @@
+from flask import Flask
+from app.utils.cache import versions
+from app.utils.http_cache import versioned_body, etag_response
+
+
+def test_versioned_body_rebuilds_after_bump():
+    app = Flask(__name__)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    with app.app_context():
+        first = versioned_body("test:body", ["test-version"], build)
+        assert versioned_body("test:body", ["test-version"], build) == first
+
+        versions.bump("test-version")
+        body, etag = versioned_body("test:body", ["test-version"], build)
+
+    assert len(calls) == 2
+    assert body == '{"n":2}'
+    assert etag != first[1]
+
+
+def test_etag_response_answers_304_on_match():
+    app = Flask(__name__)
+    with app.test_request_context(headers={"If-None-Match": '"abc"'}):
+        assert etag_response("{}", "abc").status_code == 304
+        assert etag_response("{}", "other").status_code == 200
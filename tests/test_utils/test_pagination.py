@@ -0,0 +1,93 @@
+import json
+from datetime import date
+import pytest
+from flask import Flask
+from werkzeug.exceptions import HTTPException
+from app.models import SaleView
+from app.utils.pagination import (
+    _count_key,
+    _decode_cursor,
+    _encode_cursor,
+    _seek,
+    paginate,
+    stream_rows,
+    wants_stream,
+)
+
+KEYSET = (SaleView.date, SaleView.id)
+
+
+def test_cursor_round_trip():
+    cursor = _encode_cursor([date(2024, 5, 31), 42])
+
+    assert "=" not in cursor
+    assert _decode_cursor(cursor, KEYSET) == [date(2024, 5, 31), 42]
+
+
+def test_seek_expands_to_or_of_prefixes():
+    sql = str(_seek(KEYSET, [date(2024, 5, 31), 42], descending=True))
+
+    assert sql.count(" < ") == 2
+    assert " OR " in sql
+
+
+def test_count_key_ignores_ordering_but_not_filters(app):
+    with app.app_context():
+        base = SaleView.query.filter(SaleView.distributor_id == 1)
+        other = SaleView.query.filter(SaleView.distributor_id == 2)
+
+        assert _count_key(base) == _count_key(base.order_by(SaleView.id.desc()))
+        assert _count_key(base) != _count_key(other)
+
+
+def test_wants_stream_above_cap_or_for_ndjson():
+    app = Flask(__name__)
+    app.config["PAGINATION_MAX_PAGE_SIZE"] = 100
+
+    for query, expected in [
+        ("pageSize=100", False),
+        ("pageSize=101", True),
+        ("format=ndjson", True),
+        ("", False),
+    ]:
+        with app.test_request_context(f"/?{query}"):
+            assert wants_stream() is expected
+
+
+def test_paginate_refuses_page_sizes_above_the_cap():
+    app = Flask(__name__)
+    app.config["PAGINATION_MAX_PAGE_SIZE"] = 100
+
+    with app.test_request_context("/?pageSize=101"):
+        with pytest.raises(HTTPException) as exc:
+            paginate(query=None)
+
+    assert exc.value.response.status_code == 400
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def yield_per(self, count):
+        return iter(self.rows)
+
+
+def test_stream_rows_groups_consecutive_rows_and_adds_extra_keys():
+    app = Flask(__name__)
+    rows = [(1, "a"), (1, "b"), (2, "c")]
+
+    with app.test_request_context("/?pageSize=100000"):
+        response = stream_rows(
+            FakeQuery(rows),
+            lambda group: {"id": group[0][0], "lines": [r[1] for r in group]},
+            group_by=lambda r: r[0],
+            extra={"current_distributor": 7},
+        )
+        body = json.loads(response.get_data())
+
+    assert body == {
+        "data": [{"id": 1, "lines": ["a", "b"]}, {"id": 2, "lines": ["c"]}],
+        "total": 2,
+        "current_distributor": 7,
+    }
@@ -0,0 +1,43 @@
+import threading
+import pytest
+from flask import Flask
+from app.utils.passwords import PasswordHasher, PasswordHasherBusy
+
+
+def make_hasher(**config):
+    app = Flask(__name__)
+    app.config.update(BCRYPT_LOG_ROUNDS=4, **config)
+    hasher = PasswordHasher()
+    hasher.init_app(app)
+    return hasher
+
+
+def test_hash_and_check_round_trip():
+    hasher = make_hasher()
+    pw_hash = hasher.hash("secret")
+
+    assert hasher.check(pw_hash, "secret")
+    assert not hasher.check(pw_hash, "wrong")
+    assert not hasher.needs_rehash(pw_hash)
+
+
+def test_needs_rehash_when_cost_differs():
+    hasher = make_hasher()
+
+    assert hasher.needs_rehash("$2b$12$" + "a" * 53)
+    assert not hasher.needs_rehash("not-a-bcrypt-hash")
+
+
+def test_rejects_work_beyond_pending_limit():
+    hasher = make_hasher(
+        PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1, PASSWORD_HASH_TIMEOUT=0.01
+    )
+    release = threading.Event()
+    try:
+        for _ in range(2):
+            with pytest.raises(PasswordHasherBusy):  # times out, keeps its slot
+                hasher._run(release.wait)
+        with pytest.raises(PasswordHasherBusy):  # no slot left, rejected at once
+            hasher._run(release.wait)
+    finally:
+        release.set()
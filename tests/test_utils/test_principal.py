@@ -0,0 +1,66 @@
+from unittest.mock import patch
+from flask import g
+from app.utils.principal import (
+    Principal,
+    get_principal,
+    invalidate_scope,
+    load_principal,
+)
+
+
+def test_supervisor_principal_checks_assigned_distributors():
+    principal = Principal(1, "superviseur", [3, 5], [3])
+
+    assert principal.has_distributor(3)
+    assert principal.has_distributor("5")  # IDs from JSON bodies may be strings
+    assert not principal.has_distributor(4)
+    assert not principal.has_distributor(None)
+    assert principal.default_distributor_id == 3
+    assert principal.active_distributor_ids == frozenset({3})
+
+
+def test_global_roles_see_every_distributor():
+    for role in ["admin", "dg", "dc"]:
+        assert Principal(1, role).has_distributor(42)
+
+
+def test_principal_without_assignments():
+    principal = Principal(1, "superviseur")
+
+    assert not principal.has_distributor(1)
+    assert principal.default_distributor_id is None
+
+
+def test_load_principal_is_cached_until_scope_is_invalidated(app):
+    calls = []
+
+    def fake_query(user_id):
+        calls.append(user_id)
+        return Principal(user_id, "superviseur", [1], [1])
+
+    with app.app_context(), patch(
+        "app.utils.principal._query_principal", side_effect=fake_query
+    ):
+        load_principal(7)
+        load_principal(7)
+        assert len(calls) == 1
+
+        invalidate_scope(7)
+        load_principal(7)
+        assert len(calls) == 2
+
+
+def test_get_principal_is_reloaded_for_another_user(app):
+    def fake_query(user_id):
+        return Principal(user_id, "superviseur", [user_id], [user_id])
+
+    with app.app_context(), patch(
+        "app.utils.principal._query_principal", side_effect=fake_query
+    ), patch("app.utils.principal.get_jwt_identity") as identity:
+        identity.return_value = "901"
+        assert get_principal().distributor_ids == {901}
+
+        # Same app context, next request by another user
+        identity.return_value = "902"
+        assert get_principal().distributor_ids == {902}
+        assert g.principal.id == 902
@@ -0,0 +1,153 @@
+import os
+import time
+from concurrent.futures import Future
+from datetime import date
+from decimal import Decimal
+import pytest
+from sqlalchemy import create_engine, literal, select, union_all
+from app.utils.reports import (
+    DONE,
+    QUEUED,
+    RUNNING,
+    ReportDefinition,
+    ReportError,
+    ReportRunner,
+    ReportStore,
+    _JobRecord,
+    _months,
+    _period_params,
+    job_key,
+    write_report,
+)
+
+
+def test_months_are_clipped_to_the_range():
+    assert _months(date(2024, 11, 15), date(2025, 1, 10)) == [
+        (date(2024, 11, 15), date(2024, 11, 30)),
+        (date(2024, 12, 1), date(2024, 12, 31)),
+        (date(2025, 1, 1), date(2025, 1, 10)),
+    ]
+
+
+def test_period_params_are_normalized_into_the_job_key():
+    a = _period_params({"start_date": "2024-01-01", "end_date": "2024-01-31"})
+    b = _period_params(
+        {"end_date": "2024-01-31", "start_date": "2024-01-01", "extra": 1}
+    )
+
+    assert job_key("r", a, "csv") == job_key("r", b, "csv")
+    assert job_key("r", a, "csv") != job_key("r", a, "parquet")
+
+
+def test_period_params_reject_inverted_range():
+    with pytest.raises(ReportError):
+        _period_params({"start_date": "2024-02-01", "end_date": "2024-01-01"})
+
+
+def test_store_update_and_cleanup(tmp_path):
+    store = ReportStore(str(tmp_path))
+    store.update("abc", status="queued")
+    store.update("abc", progress=50)
+
+    assert store.read("abc")["status"] == "queued"
+    assert store.read("abc")["progress"] == 50
+    assert store.read("../abc") is None
+
+    old = time.time() - 7200
+    os.utime(store.meta_path("abc"), (old, old))
+    store.cleanup(max_age=3600)
+
+    assert store.read("abc") is None
+
+
+def test_write_report_streams_parts_in_order(tmp_path):
+    def build(conn, params):
+        return [
+            union_all(
+                *(select(literal(i), literal(Decimal("1.5")) * i) for i in (1, 2, 3))
+            ),
+            select(literal(4), literal(Decimal("6.0"))),
+        ]
+
+    definition = ReportDefinition(
+        "test", "Test", [("N", "int"), ("Montant", "float")], build, None
+    )
+    progress = []
+    path = tmp_path / "out.csv"
+
+    with create_engine("sqlite://").connect() as conn:
+        rows = write_report(
+            conn, definition, {}, "csv", str(path), 2, lambda **f: progress.append(f)
+        )
+
+    assert rows == 4
+    assert path.read_text(encoding="utf-8-sig").splitlines() == [
+        "N,Montant",
+        "1,1.5",
+        "2,3.0",
+        "3,4.5",
+        "4,6.0",
+    ]
+    assert progress == [
+        {"rows": 2},
+        {"rows": 3},
+        {"progress": 50},
+        {"rows": 4},
+        {"progress": 100},
+    ]
+
+
+def test_superseded_run_stops_updating_the_job(tmp_path):
+    store = ReportStore(str(tmp_path))
+    store.write("abc", {"id": "abc", "run_id": "old", "status": QUEUED})
+    old = _JobRecord(store, "abc", "old")
+
+    assert old.update(status=RUNNING)["status"] == RUNNING
+
+    store.update("abc", run_id="new", status=QUEUED)
+
+    assert old.update(status=DONE) is None
+    assert store.read("abc")["status"] == QUEUED
+
+
+def _runner(tmp_path):
+    runner = ReportRunner()
+    runner.store = ReportStore(str(tmp_path))
+    return runner
+
+
+def _meta(status, **fields):
+    now = time.time()
+    return {
+        "id": "abc",
+        "status": status,
+        "owner_pid": os.getpid(),
+        "created_at": now,
+        "heartbeat_at": None,
+        **fields,
+    }
+
+
+def test_queued_job_is_reused_while_its_future_is_pending(tmp_path):
+    runner = _runner(tmp_path)
+    future = Future()
+    runner._futures["abc"] = future
+
+    assert runner._reusable(_meta(QUEUED))
+
+    future.set_result(None)
+    assert not runner._reusable(_meta(QUEUED))
+
+
+def test_queued_job_of_a_dead_process_is_run_again(tmp_path):
+    runner = _runner(tmp_path)
+    # Pids are never this high: no such process
+    assert not runner._reusable(_meta(QUEUED, owner_pid=2**22 + 1))
+
+
+def test_running_job_is_reused_until_its_heartbeat_stalls(tmp_path):
+    runner = _runner(tmp_path)
+    runner.stall_seconds = 60
+
+    assert runner._reusable(_meta(RUNNING, heartbeat_at=time.time() - 30))
+    assert not runner._reusable(_meta(RUNNING, heartbeat_at=time.time() - 90))
@@ -0,0 +1,21 @@
+from app.models import SaleView
+from app.utils.principal import Principal
+from app.utils.scoping import scope_to_supervisor
+
+
+def test_supervisor_scope_binds_only_the_user_id(app):
+    with app.app_context():
+        principal = Principal(7, "superviseur", range(5000))
+        query = scope_to_supervisor(SaleView.query, SaleView.distributor_id, principal)
+        compiled = query.statement.compile()
+
+    assert "EXISTS" in str(compiled)
+    assert list(compiled.params.values()) == [7]
+
+
+def test_global_roles_are_not_scoped(app):
+    with app.app_context():
+        query = SaleView.query
+        principal = Principal(1, "admin")
+
+        assert scope_to_supervisor(query, SaleView.distributor_id, principal) is query
@@ -1,5 +1,6 @@
-import pytest
+import json
 import uuid
+from datetime import date
 from app.models import Vendor, Visit, Distributor, Wilaya, Zone, Region
 
 
@@ -54,3 +55,162 @@ def test_visit_upsert_logic(client, auth_headers, db):
     db.session.refresh(visit)
     assert visit.visites_effectuees == 1
     assert visit.status == "effectuée"
+
+
+def _visit_fixture(db, test_distributor):
+    own = test_distributor
+    other = Distributor(
+        name=f"D_{uuid.uuid4().hex[:4]}", wilaya_id=own.wilaya_id, active=True
+    )
+    db.session.add(other)
+    db.session.flush()
+
+    vendors = [
+        Vendor(
+            last_name=f"V{i}",
+            first_name="Test",
+            code=f"V_{uuid.uuid4().hex[:6]}",
+            distributor_id=dist.id,
+            active=True,
+        )
+        for i, dist in enumerate([own, own, other])
+    ]
+    db.session.add_all(vendors)
+    db.session.commit()
+    return own, other, vendors
+
+
+def test_bulk_upsert_visits_inserts_updates_and_skips_foreign(
+    client, auth_headers, db, test_distributor
+):
+    own, other, (v1, v2, foreign) = _visit_fixture(db, test_distributor)
+    db.session.add(
+        Visit(
+            date="2026-02-07", vendor_id=v1.id, distributor_id=own.id, planned_visits=1
+        )
+    )
+    db.session.commit()
+
+    response = client.post(
+        "/api/supervisor/visits/bulk-upsert",
+        json=[
+            {"vendor_id": v1.id, "date": "2026-02-07", "field": "done", "value": 4},
+            {"vendor_id": v2.id, "date": "2026-02-07", "field": "prog", "value": 2},
+            {"vendor_id": v2.id, "date": "2026-02-07", "field": "invoices", "value": 1},
+            {
+                "vendor_id": foreign.id,
+                "date": "2026-02-07",
+                "field": "prog",
+                "value": 9,
+            },
+        ],
+        headers={"Authorization": auth_headers["Authorization"]},
+    )
+
+    assert response.status_code == 200
+    assert response.json["processed"] == 2
+
+    updated = Visit.query.filter_by(vendor_id=v1.id, date="2026-02-07").one()
+    assert (updated.planned_visits, updated.actual_visits) == (1, 4)
+    inserted = Visit.query.filter_by(vendor_id=v2.id, date="2026-02-07").one()
+    assert (inserted.planned_visits, inserted.invoice_count) == (2, 1)
+    assert Visit.query.filter_by(vendor_id=foreign.id).count() == 0
+
+
+def test_copy_week_clones_planned_visits(client, auth_headers, db, test_distributor):
+    own, other, (v1, v2, foreign) = _visit_fixture(db, test_distributor)
+    db.session.add_all(
+        [
+            Visit(
+                date="2026-02-07",
+                vendor_id=v1.id,
+                distributor_id=own.id,
+                planned_visits=3,
+            ),
+            Visit(
+                date="2026-02-09",
+                vendor_id=v2.id,
+                distributor_id=own.id,
+                planned_visits=2,
+            ),
+            # Already planned in the target week: kept as is without overwrite
+            Visit(
+                date="2026-02-16",
+                vendor_id=v2.id,
+                distributor_id=own.id,
+                planned_visits=7,
+            ),
+        ]
+    )
+    db.session.commit()
+
+    response = client.post(
+        "/api/supervisor/visits/copy-week",
+        json={
+            "distributor_id": own.id,
+            "source_date": "2026-02-10",
+            "target_date": "2026-02-15",
+        },
+        headers={"Authorization": auth_headers["Authorization"]},
+    )
+
+    assert response.status_code == 200
+    assert response.json["week"] == "2026-02-14"
+    assert response.json["visits"] == 1
+
+    copied = Visit.query.filter_by(vendor_id=v1.id, date="2026-02-14").one()
+    assert (copied.planned_visits, copied.actual_visits) == (3, 0)
+    kept = Visit.query.filter_by(vendor_id=v2.id, date="2026-02-16").one()
+    assert kept.planned_visits == 7
+
+
+def test_copy_week_denied_for_foreign_distributor(
+    client, auth_headers, db, test_distributor
+):
+    own, other, _ = _visit_fixture(db, test_distributor)
+
+    response = client.post(
+        "/api/supervisor/visits/copy-week",
+        json={
+            "distributor_id": other.id,
+            "source_date": "2026-02-07",
+            "target_date": "2026-02-14",
+        },
+        headers={"Authorization": auth_headers["Authorization"]},
+    )
+
+    assert response.status_code == 403
+
+
+def test_range_matrix_keeps_the_latest_duplicate_visit(
+    client, auth_headers, db, test_distributor
+):
+    own, other, (v1, v2, foreign) = _visit_fixture(db, test_distributor)
+    first = Visit(
+        date=date(2026, 2, 7), vendor_id=v1.id, distributor_id=own.id, planned_visits=1
+    )
+    db.session.add(first)
+    db.session.flush()
+    latest = Visit(
+        date=date(2026, 2, 7), vendor_id=v1.id, distributor_id=own.id, planned_visits=5
+    )
+    db.session.add(latest)
+    db.session.commit()
+
+    url = (
+        f"/api/supervisor/visits/matrix/range?distributor_id={own.id}"
+        "&start_date=2026-02-07&end_date=2026-02-07"
+    )
+    headers = {"Authorization": auth_headers["Authorization"]}
+    for suffix in ("", "&format=ndjson"):
+        response = client.get(url + suffix, headers=headers)
+        assert response.status_code == 200
+        if suffix:
+            rows = [
+                json.loads(line)
+                for line in response.get_data(as_text=True).splitlines()
+            ]
+        else:
+            rows = response.json["data"]
+        (day,) = next(r for r in rows if r["vendor_id"] == v1.id)["days"]
+        assert (day["visit_id"], day["planned"]) == (latest.id, 5)